@@ -0,0 +1,14 @@
+import os
+
+# Multi-worker deployment: `gunicorn -c gunicorn_conf.py porsche_charging_app.main:app`
+#
+# Workers default to 1: the app embeds the charge controller
+# (RUN_BACKGROUND defaults to true) and keeps per-process state (price
+# threshold, mock price, caches), so N unconfigured workers would mean N
+# controllers independently commanding the vehicle. Scaling out is
+# opt-in: set WEB_CONCURRENCY explicitly and RUN_BACKGROUND=0 on this
+# deployment, with the controller running in a separate single-worker
+# instance.
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_class = "uvicorn.workers.UvicornWorker"
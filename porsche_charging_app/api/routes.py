@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
-from ..services.porsche_service import get_porsche_service
+from ..services.porsche_service import get_porsche_service, PorscheService
 from ..services.price_service import get_price_service, generate_price_chart
+from ..services.charge_controller import get_charge_controller
 from ..core.config import settings
 import asyncio
 import logging
@@ -13,21 +14,24 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# BATTERY_CHARGING_STATE values that mean the vehicle is drawing power
+_CHARGING_STATES = frozenset({'CHARGING', 'ON'})
+
+async def require_porsche_auth() -> PorscheService:
+    """Dependency: return the Porsche service, authenticating if needed."""
+    porsche_service = get_porsche_service()
+    if not await porsche_service.authenticate_if_needed():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated with Porsche Connect"
+        )
+    return porsche_service
+
 @router.get("/vehicle/status")
-async def get_vehicle_status() -> Dict[str, Any]:
+async def get_vehicle_status(
+    porsche_service: PorscheService = Depends(require_porsche_auth)
+) -> Dict[str, Any]:
     """Get current vehicle status"""
-    porsche_service = get_porsche_service()
-    
-    # Check if authenticated
-    if not porsche_service.is_authenticated():
-        authenticated = await porsche_service.authenticate()
-        if not authenticated:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated with Porsche Connect"
-            )
-    
-    # Get vehicle status
     vehicle_status = await porsche_service.get_vehicle_status()
     
     if "error" in vehicle_status:
@@ -39,20 +43,10 @@ async def get_vehicle_status() -> Dict[str, Any]:
     return vehicle_status
 
 @router.get("/vehicle/charging")
-async def get_charging_status() -> Dict[str, Any]:
+async def get_charging_status(
+    porsche_service: PorscheService = Depends(require_porsche_auth)
+) -> Dict[str, Any]:
     """Get vehicle charging status"""
-    porsche_service = get_porsche_service()
-    
-    # Check if authenticated
-    if not porsche_service.is_authenticated():
-        authenticated = await porsche_service.authenticate()
-        if not authenticated:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated with Porsche Connect"
-            )
-    
-    # Get charging status
     charging_status = await porsche_service.get_charging_status()
     
     if "error" in charging_status:
@@ -64,20 +58,10 @@ async def get_charging_status() -> Dict[str, Any]:
     return charging_status
 
 @router.post("/vehicle/charging/start")
-async def start_charging() -> Dict[str, Any]:
+async def start_charging(
+    porsche_service: PorscheService = Depends(require_porsche_auth)
+) -> Dict[str, Any]:
     """Start charging the vehicle"""
-    porsche_service = get_porsche_service()
-    
-    # Check if authenticated
-    if not porsche_service.is_authenticated():
-        authenticated = await porsche_service.authenticate()
-        if not authenticated:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated with Porsche Connect"
-            )
-    
-    # Start charging
     success = await porsche_service.start_charging()
     
     if not success:
@@ -89,20 +73,10 @@ async def start_charging() -> Dict[str, Any]:
     return {"status": "success", "message": "Charging started"}
 
 @router.post("/vehicle/charging/stop")
-async def stop_charging() -> Dict[str, Any]:
+async def stop_charging(
+    porsche_service: PorscheService = Depends(require_porsche_auth)
+) -> Dict[str, Any]:
     """Stop charging the vehicle"""
-    porsche_service = get_porsche_service()
-    
-    # Check if authenticated
-    if not porsche_service.is_authenticated():
-        authenticated = await porsche_service.authenticate()
-        if not authenticated:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated with Porsche Connect"
-            )
-    
-    # Stop charging
     success = await porsche_service.stop_charging()
     
     if not success:
@@ -113,13 +87,12 @@ async def stop_charging() -> Dict[str, Any]:
     
     return {"status": "success", "message": "Charging stopped"}
 
-@router.get("/prices/live")
+@router.get("/prices/live", response_class=ORJSONResponse)
 async def get_live_data():
     """Get live electricity prices and vehicle status"""
     price_service = get_price_service()
     porsche_service = get_porsche_service()
 
-    # Fetch all data in parallel
     # Fetch all data in parallel
     results = await asyncio.gather(
         porsche_service.get_vehicle_overview(),
@@ -130,12 +103,16 @@ async def get_live_data():
 
     vehicle_overview, live_prices, electricity_prices = results
 
-    # Create a consolidated response
-    response_data = {}
+    # Consolidated response with a fixed shape; fields overwritten below
+    response_data = {
+        "general": None,
+        "feed_in": None,
+        "vehicle_overview": None,
+        "electricity_prices": [],
+    }
 
     if isinstance(live_prices, Exception):
         logger.error(f"Live prices error in API: {live_prices}")
-        response_data.update({"general": None, "feed_in": None})
     elif live_prices:
         response_data.update(live_prices)
 
@@ -145,13 +122,14 @@ async def get_live_data():
     else:
         # Add binary charging state safely
         battery_charging_state = vehicle_overview.get('BATTERY_CHARGING_STATE')
-        state_str = str(battery_charging_state).upper() if battery_charging_state is not None else ""
-        vehicle_overview['is_charging'] = state_str in ['CHARGING', 'ON']
+        vehicle_overview['is_charging'] = (
+            isinstance(battery_charging_state, str)
+            and battery_charging_state.upper() in _CHARGING_STATES
+        )
         response_data["vehicle_overview"] = vehicle_overview
 
     if isinstance(electricity_prices, Exception):
         logger.error(f"Electricity prices error in API: {electricity_prices}")
-        response_data["electricity_prices"] = []
     else:
         response_data["electricity_prices"] = electricity_prices
 
@@ -211,16 +189,18 @@ async def set_price_threshold_api(request: PriceThresholdRequest):
     success = price_service.set_price_threshold(request.threshold)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to set price threshold")
+    # Re-evaluate charging against the new threshold right away
+    get_charge_controller().wake()
     return {"status": "success", "message": f"Price threshold set to {request.threshold}"}
 
 @router.get("/config/mock_price", response_model=Dict[str, Optional[float]])
 async def get_mock_price_api():
     price_service = get_price_service()
-    price = price_service.get_mock_price()
+    price = await price_service.get_mock_price()
     return {"mock_price": price}
 
 @router.post("/config/mock_price")
 async def set_mock_price_api(request: MockPriceRequest):
     price_service = get_price_service()
-    price_service.set_mock_price(request.price)
+    await price_service.set_mock_price(request.price)
     return {"status": "success", "message": f"Mock price set to {request.price}"}
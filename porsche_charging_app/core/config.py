@@ -1,42 +1,52 @@
-import os
-import json
+import orjson
 from pathlib import Path
-from pydantic import BaseModel
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 CONFIG_FILE = Path("porsche_charging_app/config.json")
 
-class Settings(BaseModel):
+class Settings(BaseSettings):
+    """Application settings, resolved once from the environment/.env file
+    by pydantic-settings instead of per-field os.getenv calls."""
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
     # Application settings
     APP_NAME: str = "Porsche Smart Charging"
-    DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
+    DEBUG: bool = False
     LOG_FILE: str = "porsche_charging.log"
 
     # Porsche Connect API credentials
-    PORSCHE_EMAIL: str = os.getenv("PORSCHE_EMAIL", "")
-    PORSCHE_PASSWORD: str = os.getenv("PORSCHE_PASSWORD", "")
+    PORSCHE_EMAIL: str = ""
+    PORSCHE_PASSWORD: str = ""
 
     # 2Captcha API key (for solving Porsche login captchas)
-    CAPTCHA_API_KEY: str = os.getenv("2CAPTCHA_API_KEY", "")
+    CAPTCHA_API_KEY: str = Field("", validation_alias="2CAPTCHA_API_KEY")
 
     # Amber Electric API Key
-    AMBER_API_KEY: str = os.getenv("AMBER_API_KEY", "")
+    AMBER_API_KEY: str = ""
+
+    # Client-side ceiling on Amber API calls per second
+    AMBER_MAX_RPS: int = 10
 
     # Optional fallback Electricity price API settings
-    PRICE_API_URL: str = os.getenv("PRICE_API_URL", "")
-    PRICE_API_KEY: str = os.getenv("PRICE_API_KEY", "")
+    PRICE_API_URL: str = ""
+    PRICE_API_KEY: str = ""
 
-    # Charging settings - these can be updated at runtime
+    # Charging settings - these can be updated at runtime, so the model
+    # deliberately stays mutable (a frozen model would break save()/load())
     PRICE_THRESHOLD: float = 0.15  # Default threshold
     TARGET_SOC: int = 80  # Default target state of charge
     AUTO_MODE_ENABLED: bool = True
 
+    # Run the background charge controller in this process. Turn off in all
+    # but one worker when deploying with multiple gunicorn/uvicorn workers,
+    # otherwise each worker polls the Porsche API independently.
+    RUN_BACKGROUND: bool = True
+
     # Price check interval (in minutes)
     PRICE_CHECK_INTERVAL: int = 5
-    
+
     # Vehicle status check interval (in minutes)
     VEHICLE_CHECK_INTERVAL: int = 15
 
@@ -44,7 +54,7 @@ class Settings(BaseModel):
     SESSION_FILE: Path = Path("porsche_session.json")
 
     # Database settings
-    DATABASE_URL: str = os.getenv("DATABASE_URL", f"sqlite:///./porsche_charging.db")
+    DATABASE_URL: str = "sqlite:///./porsche_charging.db"
 
     def save(self):
         """Saves the mutable settings to the config file."""
@@ -54,22 +64,19 @@ class Settings(BaseModel):
             "AUTO_MODE_ENABLED": self.AUTO_MODE_ENABLED,
             "VEHICLE_CHECK_INTERVAL": self.VEHICLE_CHECK_INTERVAL
         }
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(mutable_settings, f, indent=4)
+        CONFIG_FILE.write_bytes(orjson.dumps(mutable_settings, option=orjson.OPT_INDENT_2))
 
     def load(self):
         """Loads mutable settings from the config file if it exists."""
-        if CONFIG_FILE.exists():
-            with open(CONFIG_FILE, 'r') as f:
-                try:
-                    mutable_settings = json.load(f)
-                    self.PRICE_THRESHOLD = mutable_settings.get("PRICE_THRESHOLD", self.PRICE_THRESHOLD)
-                    self.TARGET_SOC = mutable_settings.get("TARGET_SOC", self.TARGET_SOC)
-                    self.AUTO_MODE_ENABLED = mutable_settings.get("AUTO_MODE_ENABLED", self.AUTO_MODE_ENABLED)
-                    self.VEHICLE_CHECK_INTERVAL = mutable_settings.get("VEHICLE_CHECK_INTERVAL", self.VEHICLE_CHECK_INTERVAL)
-                except json.JSONDecodeError:
-                    # If the file is corrupted or empty, just use defaults
-                    pass
+        try:
+            mutable_settings = orjson.loads(CONFIG_FILE.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            # No file yet, or a corrupted/empty one: just use defaults
+            return
+        self.PRICE_THRESHOLD = mutable_settings.get("PRICE_THRESHOLD", self.PRICE_THRESHOLD)
+        self.TARGET_SOC = mutable_settings.get("TARGET_SOC", self.TARGET_SOC)
+        self.AUTO_MODE_ENABLED = mutable_settings.get("AUTO_MODE_ENABLED", self.AUTO_MODE_ENABLED)
+        self.VEHICLE_CHECK_INTERVAL = mutable_settings.get("VEHICLE_CHECK_INTERVAL", self.VEHICLE_CHECK_INTERVAL)
 
 # Create settings instance
 settings = Settings()
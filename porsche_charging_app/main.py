@@ -1,10 +1,12 @@
 import logging
 import asyncio
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from jinja2 import FileSystemBytecodeCache
 
 from .core.config import settings
 from .api.routes import router as api_router
@@ -37,7 +39,7 @@ async def lifespan(app: FastAPI):
     charge_controller = get_charge_controller()
     
     # Initialize database
-    init_db()
+    await init_db()
     
     # Try to authenticate with Porsche Connect
     try:
@@ -49,14 +51,23 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error during authentication: {e}")
     
-    # Start background tasks
-    charge_controller.start()
-    
+    # Start background tasks (gated so multi-worker deployments can run
+    # the controller in a single worker only)
+    if settings.RUN_BACKGROUND:
+        charge_controller.start()
+        price_service.start_refresher()
+    else:
+        logger.info("RUN_BACKGROUND disabled; charge controller not started in this worker.")
+
     yield
-    
+
     # Shutdown: Cleanup resources
     logger.info("Shutting down application...")
-    charge_controller.stop()
+    if settings.RUN_BACKGROUND:
+        charge_controller.stop()
+    await porsche_service.flush_status_buffer()
+    await porsche_service.captcha_solver.close()
+    await price_service.close()
     if porsche_service.conn:
         await porsche_service.conn.close()
 
@@ -65,7 +76,10 @@ app = FastAPI(
     title="Porsche Connect Manager",
     description="Application for managing Porsche vehicle status and charging",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serializes the nested overview/price payloads several-fold
+    # faster than the stdlib default
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -77,8 +91,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Templates
+# Templates. Auto-reload off skips the per-render mtime stat, and the
+# bytecode cache persists compiled templates across restarts/workers.
 templates = Jinja2Templates(directory="porsche_charging_app/templates")
+templates.env.auto_reload = settings.DEBUG
+templates.env.bytecode_cache = FileSystemBytecodeCache()
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="porsche_charging_app/static"), name="static")
@@ -90,30 +107,43 @@ async def root(request: Request):
     try:
         porsche_service = get_porsche_service()
         price_service = get_price_service()
-
-        # Parallel fetch of all data
-        results = await asyncio.gather(
-            porsche_service.get_vehicle_overview(),
-            price_service.get_live_prices(),
-            price_service.get_amber_prices(hours=12),
-            return_exceptions=True
-        )
-        vehicle_overview, live_prices, electricity_prices = results
-
-        # Handle potential errors from API calls
-        error = None
-        if isinstance(vehicle_overview, Exception) or (isinstance(vehicle_overview, dict) and vehicle_overview.get("error")):
-            error = f"Could not retrieve vehicle overview: {vehicle_overview}"
-            vehicle_overview = {} # Provide empty dict to template
-        if isinstance(live_prices, Exception):
-            error = f"Could not retrieve live prices: {live_prices}"
-            live_prices = {} # Provide empty dict to template
-
-        if isinstance(electricity_prices, Exception):
-            error = f"Could not retrieve electricity prices: {electricity_prices}"
-            electricity_prices = []
-
-        # logger.info(f"Electricity prices for template: {electricity_prices}")
+        errors = []
+
+        async def fetch(coro, fallback, what):
+            # Failures degrade to a fallback value inside the task, so one
+            # slow/broken upstream never cancels its TaskGroup siblings
+            try:
+                return await coro
+            except Exception as e:
+                logger.error(f"Could not retrieve {what}: {e}")
+                errors.append(f"Could not retrieve {what}: {e}")
+                return fallback
+
+        # Prefer the snapshot precomputed by the charge controller cycle;
+        # rendering from it makes the page load pure template work
+        snapshot = get_charge_controller().last_dashboard_snapshot
+        if snapshot:
+            vehicle_overview = snapshot["vehicle_overview"]
+            live_prices = snapshot["live_prices"]
+            electricity_prices = snapshot["electricity_prices"]
+        else:
+            # No cycle has completed yet (or the controller is disabled in
+            # this worker): fall back to fetching everything in parallel
+            async with asyncio.TaskGroup() as tg:
+                t_overview = tg.create_task(
+                    fetch(porsche_service.get_vehicle_overview(), {}, "vehicle overview"))
+                t_live = tg.create_task(
+                    fetch(price_service.get_live_prices(), {}, "live prices"))
+                t_amber = tg.create_task(
+                    fetch(price_service.get_amber_prices(hours=12), [], "electricity prices"))
+            vehicle_overview = t_overview.result()
+            live_prices = t_live.result()
+            electricity_prices = t_amber.result()
+
+        if isinstance(vehicle_overview, dict) and vehicle_overview.get("error"):
+            errors.append(f"Could not retrieve vehicle overview: {vehicle_overview['error']}")
+            vehicle_overview = {}  # Provide empty dict to template
+        error = errors[-1] if errors else None
 
         context = {
             "request": request,
@@ -136,9 +166,6 @@ async def root(request: Request):
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="porsche_charging_app/static"), name="static")
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("porsche_charging_app.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("porsche_charging_app.main:app", host="0.0.0.0", port=8000, http="httptools")
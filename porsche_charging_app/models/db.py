@@ -1,18 +1,61 @@
+import orjson
 import logging
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime
+from sqlalchemy import Column, Integer, Float, String, DateTime, LargeBinary, TypeDecorator, event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
 from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Create database engine
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _async_database_url(url: str) -> str:
+    """Map a plain SQLAlchemy URL onto its async driver."""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+# Create database engine (async, so DB calls don't block the event loop)
+_db_url = _async_database_url(settings.DATABASE_URL)
+engine = create_async_engine(
+    _db_url,
+    pool_pre_ping=True,
+    # On SQLite, wait out a writer's lock instead of failing immediately
+    connect_args={"timeout": 30} if _db_url.startswith("sqlite") else {},
+)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, connection_record):
+        """Tune each new SQLite connection: WAL lets readers proceed while
+        a writer commits, which keeps dashboard reads off the write lock."""
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
 Base = declarative_base()
 
+class OrjsonType(TypeDecorator):
+    """JSON column stored as a binary blob, (de)serialized with orjson.
+
+    Avoids the text round-trip of a String column: callers bind/read plain
+    dicts and orjson handles nested payloads like the full Porsche overview
+    several times faster than json.dumps/loads.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else orjson.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else orjson.loads(value)
+
 # Define models
 class VehicleStatus(Base):
     """Model for storing vehicle status data"""
@@ -24,7 +67,7 @@ class VehicleStatus(Base):
     battery_level = Column(Float)
     battery_charging_state = Column(String)
     estimated_range = Column(Float)
-    raw_data = Column(String)  # JSON string of full status data
+    raw_data = Column(OrjsonType)  # full status payload, stored as orjson blob
 
 class Price(Base):
     """Model for storing electricity price data"""
@@ -42,10 +85,11 @@ class Configuration(Base):
     value = Column(String)
 
 # Create tables
-def init_db():
+async def init_db():
     """Initialize the database"""
     try:
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
@@ -53,9 +97,35 @@ def init_db():
 # Get database session
 def get_db_session():
     """Get a database session"""
-    db = SessionLocal()
+    return SessionLocal()
+
+async def bulk_save_vehicle_status(rows):
+    """Insert many vehicle status snapshots with one executemany statement.
+
+    Takes a list of column dicts; one INSERT per flush instead of one
+    commit (and fsync) per snapshot.
+    """
+    if not rows:
+        return
+    session = get_db_session()
+    try:
+        await session.execute(insert(VehicleStatus), rows)
+        await session.commit()
+    finally:
+        await session.close()
+
+async def bulk_save_prices(rows):
+    """Insert many price rows with one executemany statement.
+
+    Takes a list of {"timestamp": ..., "value": ...} dicts. One INSERT in a
+    single transaction amortizes the per-row ORM and commit overhead when
+    backfilling price history.
+    """
+    if not rows:
+        return
+    session = get_db_session()
     try:
-        return db
-    except:
-        db.close()
-        raise
+        await session.execute(insert(Price), rows)
+        await session.commit()
+    finally:
+        await session.close()
@@ -1,3 +1,4 @@
+import time
 import asyncio
 import logging
 from .porsche_service import get_porsche_service, PorscheService
@@ -6,12 +7,42 @@ from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# BATTERY_CHARGING_STATE values that mean the vehicle is drawing power
+_CHARGING_STATES = frozenset({'CHARGING', 'ON'})
+
+def _detect_charging_state(overview: dict) -> tuple:
+    """Derive (is_charging, is_plugged_in) from a vehicle overview.
+
+    Collapses the three observed signals — BATTERY_CHARGING_STATE,
+    CHARGING_SUMMARY.status (the most reliable) and a non-zero
+    CHARGING_RATE.chargingPower — into one pass over the dict.
+    """
+    summary = overview.get('CHARGING_SUMMARY') or {}
+    summary_status = summary.get('status') if isinstance(summary, dict) else None
+    rate = overview.get('CHARGING_RATE') or {}
+    charging_power = rate.get('chargingPower', 0) if isinstance(rate, dict) else 0
+    bcs = str(overview.get('BATTERY_CHARGING_STATE', '')).upper()
+
+    is_charging = (
+        bcs in _CHARGING_STATES
+        or summary_status == 'CHARGING'
+        or charging_power > 0
+    )
+    is_plugged_in = is_charging or summary_status not in (None, 'NOT_PLUGGED')
+    return is_charging, is_plugged_in
+
 class ChargeController:
     def __init__(self, porsche_service: PorscheService, price_service: PriceService):
         self.porsche_service = porsche_service
         self.price_service = price_service
         self.is_running = False
         self.task = None
+        # Set by API routes (e.g. a threshold change) to make the controller
+        # re-evaluate immediately instead of waiting out the interval
+        self.wakeup_event = asyncio.Event()
+        # Last dashboard data, refreshed each controller cycle so the root
+        # route can render from memory instead of awaiting upstream APIs
+        self.last_dashboard_snapshot: dict = {}
 
     async def _ensure_authenticated(self):
         if not self.porsche_service.is_authenticated():
@@ -32,43 +63,15 @@ class ChargeController:
             current_price = await self.price_service.get_current_price()
             price_threshold = self.price_service.get_price_threshold()
 
-            # Fetch the latest vehicle overview
-            vehicle_overview = await self.porsche_service.get_vehicle_overview(force_refresh=True)
+            # Fetch the vehicle overview, reusing a fresh cached one if the
+            # dashboard (or a previous cycle) fetched within the TTL
+            vehicle_overview = await self.porsche_service.get_vehicle_overview()
             if not vehicle_overview or vehicle_overview.get("error"):
                 logger.error(f"Could not retrieve vehicle overview: {vehicle_overview.get('error', 'Unknown error')}")
                 return
 
-            # Determine charging state from the overview - check multiple fields
-            is_charging = False
-            is_plugged_in = False
-            
-            # Method 1: Check BATTERY_CHARGING_STATE field
-            battery_charging_state = vehicle_overview.get('BATTERY_CHARGING_STATE')
-            if battery_charging_state is not None:
-                state_str = str(battery_charging_state).upper()
-                if state_str in ['CHARGING', 'ON']:
-                    is_charging = True
-                    logger.debug(f"Charging detected via BATTERY_CHARGING_STATE: {state_str}")
-            
-            # Method 2: Check CHARGING_SUMMARY field (more reliable based on observations)
-            charging_summary = vehicle_overview.get('CHARGING_SUMMARY', {})
-            if isinstance(charging_summary, dict):
-                # Check if charging
-                if charging_summary.get('status') == 'CHARGING':
-                    is_charging = True
-                    is_plugged_in = True
-                    logger.debug(f"Charging detected via CHARGING_SUMMARY: {charging_summary.get('status')}")
-                # Check if plugged in but not charging
-                elif charging_summary.get('status') not in ['NOT_PLUGGED', None]:
-                    is_plugged_in = True
-                    logger.debug(f"Vehicle is plugged in but not charging. Status: {charging_summary.get('status')}")
-                
-            # Method 3: Check CHARGING_RATE field for non-zero charging power
-            charging_rate = vehicle_overview.get('CHARGING_RATE', {})
-            if isinstance(charging_rate, dict) and charging_rate.get('chargingPower', 0) > 0:
-                is_charging = True
-                is_plugged_in = True
-                logger.debug(f"Charging detected via CHARGING_RATE: power={charging_rate.get('chargingPower')}kW")
+            # Determine charging state from the overview in one pass
+            is_charging, is_plugged_in = _detect_charging_state(vehicle_overview)
 
             logger.info(f"Current Price: {current_price:.2f}c, Threshold: {price_threshold:.2f}c, Currently Charging: {is_charging}, Plugged In: {is_plugged_in}")
 
@@ -88,16 +91,59 @@ class ChargeController:
                 else:
                     logger.info(f"Price ({current_price:.2f}c) is above threshold, and car is not charging. No action needed.")
 
+            # Reuse the overview we already have for the dashboard snapshot
+            await self._update_dashboard_snapshot(vehicle_overview)
+
         except Exception as e:
             logger.error(f"An error occurred in the charging logic: {e}", exc_info=True)
 
+    async def _update_dashboard_snapshot(self, vehicle_overview):
+        """Refresh the precomputed dashboard data from this cycle's overview
+        plus the current price feeds."""
+        try:
+            live_prices, electricity_prices = await asyncio.gather(
+                self.price_service.get_live_prices(),
+                self.price_service.get_amber_prices(hours=12),
+            )
+            self.last_dashboard_snapshot = {
+                "vehicle_overview": vehicle_overview,
+                "live_prices": live_prices,
+                "electricity_prices": electricity_prices,
+            }
+        except Exception as e:
+            logger.error(f"Failed to update dashboard snapshot: {e}")
+
+    def _next_wakeup_seconds(self) -> float:
+        """Seconds until the next check-interval boundary.
+
+        Amber prices tick on fixed clock boundaries, so aligning to them
+        (rather than sleeping a flat interval from "now") reacts to a price
+        change right after it lands instead of up to an interval later.
+        """
+        interval = settings.VEHICLE_CHECK_INTERVAL * 60
+        # Small slack past the boundary so the provider has published
+        return interval - (time.time() % interval) + 5
+
     async def _periodic_task(self):
         while self.is_running:
+            # Clear before the run: a wake() fired while the cycle is
+            # executing then survives into the wait below and triggers an
+            # immediate re-evaluation instead of being erased
+            self.wakeup_event.clear()
             await self.run_charging_logic()
-            # Use the configurable vehicle check interval
-            check_interval_minutes = settings.VEHICLE_CHECK_INTERVAL
-            logger.debug(f"Sleeping for {check_interval_minutes} minutes before next vehicle status check")
-            await asyncio.sleep(check_interval_minutes * 60)
+            timeout = self._next_wakeup_seconds()
+            logger.debug(f"Sleeping {timeout:.0f}s until the next price boundary")
+            try:
+                # A set() from an API route (threshold/auto-mode change)
+                # short-circuits the wait for an immediate re-evaluation
+                await asyncio.wait_for(self.wakeup_event.wait(), timeout=timeout)
+                logger.info("Charge controller woken early by a settings change.")
+            except asyncio.TimeoutError:
+                pass
+
+    def wake(self):
+        """Trigger an immediate charging-logic evaluation."""
+        self.wakeup_event.set()
 
     def start(self):
         if not self.is_running:
@@ -1,7 +1,11 @@
 import os
-import json
+import time
+import orjson
 import logging
+import random
 import asyncio
+import aiofiles
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 
@@ -11,18 +15,54 @@ from pyporscheconnectapi.exceptions import PorscheCaptchaRequiredError, PorscheW
 from pyporscheconnectapi.remote_services import RemoteServices
 
 from ..core.config import settings
+from ..models.db import bulk_save_vehicle_status
 from ..utils.captcha_solver import CaptchaSolver
 
 logger = logging.getLogger(__name__)
 
+# Remote command statuses that count as success
+_OK_STATUSES = frozenset(('SUCCESS', 'PERFORMED'))
+
+def _is_ok(result) -> bool:
+    """True when a remote-service result reports a successful status."""
+    return getattr(result, 'status', None) in _OK_STATUSES
+
+# Retry backoff schedules in seconds, indexed by attempt
+_TRANSIENT_DELAYS = (2, 4)     # incomplete data / gateway timeouts
+_RATE_LIMIT_DELAYS = (30, 60)  # 429 responses need a longer wait
+
+async def _backoff_sleep(delays, attempt):
+    """Sleep for the scheduled delay plus up to 50% random jitter.
+
+    The jitter keeps multiple workers (or a controller cycle plus a
+    dashboard load) from retrying against the Porsche API in lockstep.
+    """
+    delay = delays[min(attempt, len(delays) - 1)]
+    await asyncio.sleep(delay + random.uniform(0, 0.5 * delay))
+
 class PorscheService:
     """Service for interacting with Porsche Connect API"""
-    
+
+    # How long a fetched overview stays fresh; browser polls within this
+    # window are served from the cached vehicle data.
+    OVERVIEW_CACHE_TTL = 30
+
+    # Status snapshots are buffered and flushed together: after this many
+    # snapshots or this many seconds, whichever comes first
+    STATUS_FLUSH_MAX = 5
+    STATUS_FLUSH_INTERVAL = 60
+
     def __init__(self):
         self.conn = None
         self.account = None
         self.vehicle = None
         self.captcha_solver = CaptchaSolver()
+        self._token = None  # in-memory session token; disk is only a backup
+        self._last_overview_ts = 0.0  # monotonic time of the last overview fetch
+        self._overview_lock = asyncio.Lock()
+        self._inflight: Optional[asyncio.Task] = None  # single-flight overview fetch
+        self._status_buffer: List[dict] = []  # snapshots awaiting a bulk insert
+        self._last_status_flush = time.monotonic()
         
     def is_authenticated(self) -> bool:
         """Check if we are authenticated and have a vehicle selected."""
@@ -34,23 +74,39 @@ class PorscheService:
             return True
         return await self.authenticate()
     
+    async def _close_connection(self):
+        """Close the previous Connection so its pooled sockets are released.
+
+        The Connection keeps one HTTP session (and its keep-alive pool) for
+        as long as it lives; replacing it without closing leaks sockets on
+        every re-authentication attempt.
+        """
+        if self.conn is not None:
+            try:
+                await self.conn.close()
+            except Exception as e:
+                logger.debug(f"Error closing previous connection: {e}")
+            self.conn = None
+
     async def authenticate(self) -> bool:
         """Authenticate with Porsche Connect API"""
         try:
             # Try to load session from file
-            token = self._load_session()
-            
+            token = await self._load_session()
+
             if token:
                 # Try to use existing token
+                await self._close_connection()
                 self.conn = Connection(token=token)
                 self.account = PorscheConnectAccount(connection=self.conn)
                 try:
-                    await self.account.get_vehicles()
+                    vehicles = await self.account.get_vehicles()
                     logger.info("Successfully authenticated using saved session")
-                    await self._select_vehicle()
+                    await self._select_vehicle(vehicles)
                     return True
                 except Exception as e:
                     logger.warning(f"Saved session is invalid or expired: {e}")
+                    self._token = None  # don't serve the dead token from cache
                     # Continue with fresh login
             
             # Authenticate with username/password
@@ -66,16 +122,17 @@ class PorscheService:
             
             for attempt in range(max_attempts):
                 try:
+                    await self._close_connection()
                     self.conn = Connection(email, password, captcha_code=captcha_code, state=captcha_state)
                     self.account = PorscheConnectAccount(connection=self.conn)
-                    await self.account.get_vehicles()
-                    self._save_session(self.conn.token)
+                    vehicles = await self.account.get_vehicles()
+                    await self._save_session(self.conn.token)
                     logger.info("Successfully authenticated with Porsche Connect")
-                    await self._select_vehicle()
+                    await self._select_vehicle(vehicles)
                     return True
                 except PorscheCaptchaRequiredError as e:
                     logger.warning("CAPTCHA challenge received")
-                    captcha_code = self.captcha_solver.solve_image_captcha(e.captcha)
+                    captcha_code = await self.captcha_solver.solve_image_captcha(e.captcha)
                     captcha_state = e.state
                     
                     if not captcha_code:
@@ -97,12 +154,17 @@ class PorscheService:
             logger.error(f"Unexpected error during authentication: {e}")
             return False
     
-    async def _select_vehicle(self):
-        """Select the first vehicle from the account"""
+    async def _select_vehicle(self, vehicles: Optional[List] = None):
+        """Select the first vehicle from the account.
+
+        Accepts the vehicle list when the caller already fetched it during
+        authentication, avoiding a second get_vehicles round-trip.
+        """
         if not self.account:
             return
-        
-        vehicles = await self.account.get_vehicles()
+
+        if vehicles is None:
+            vehicles = await self.account.get_vehicles()
         if not vehicles:
             logger.warning("No vehicles found in account")
             return
@@ -110,22 +172,31 @@ class PorscheService:
         self.vehicle = vehicles[0]
         logger.info(f"Selected vehicle: {self.vehicle.model_name} ({self.vehicle.vin})")
     
-    def _save_session(self, token):
-        """Save session token to file"""
+    async def _save_session(self, token):
+        """Persist the session token, skipping disk when it hasn't changed."""
+        if token == self._token:
+            return
+        self._token = token
         try:
             logger.info(f"Saving session to {settings.SESSION_FILE}")
-            with open(settings.SESSION_FILE, "w") as f:
-                json.dump(token, f, indent=2)
+            # aiofiles keeps the write off the event loop
+            async with aiofiles.open(settings.SESSION_FILE, "wb") as f:
+                await f.write(orjson.dumps(token, option=orjson.OPT_INDENT_2))
         except Exception as e:
             logger.error(f"Failed to save session: {e}")
-    
-    def _load_session(self):
-        """Load session token from file"""
+
+    async def _load_session(self):
+        """Return the cached session token, reading the file once if needed."""
+        if self._token is not None:
+            return self._token
+        # EAFP: reading directly avoids the exists() stat and its race
         try:
-            if settings.SESSION_FILE.exists():
-                logger.info(f"Loading session from {settings.SESSION_FILE}")
-                with open(settings.SESSION_FILE, "r") as f:
-                    return json.load(f)
+            async with aiofiles.open(settings.SESSION_FILE, "rb") as f:
+                self._token = orjson.loads(await f.read())
+            logger.info(f"Loaded session from {settings.SESSION_FILE}")
+            return self._token
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.error(f"Failed to load session: {e}")
         return None
@@ -139,7 +210,13 @@ class PorscheService:
             logger.info("Forcing refresh of vehicle data.")
 
         try:
-            await self._get_overview_with_retry(force_refresh=force_refresh)
+            if force_refresh or self._overview_expired():
+                # The lock coalesces concurrent pollers into one upstream call
+                async with self._overview_lock:
+                    if force_refresh or self._overview_expired():
+                        await self._get_overview_with_retry(force_refresh=force_refresh)
+            else:
+                logger.debug("Serving vehicle overview from cache.")
             logger.debug(f"Full vehicle data: {self.vehicle.data}")
             return self.vehicle.data
         except PorscheExceptionError as e:
@@ -149,18 +226,41 @@ class PorscheService:
             logger.error(f"Unexpected error in get_vehicle_overview: {e}", exc_info=True)
             return {"error": "An unexpected error occurred while fetching vehicle overview."}
 
+    def _overview_expired(self) -> bool:
+        """True when the cached overview is older than OVERVIEW_CACHE_TTL."""
+        return time.monotonic() - self._last_overview_ts > self.OVERVIEW_CACHE_TTL
+
     async def _get_overview_with_retry(self, force_refresh: bool = False):
+        """Single-flight wrapper around the overview fetch.
+
+        Callers arriving while a fetch is in progress (e.g. the dashboard
+        and the charge controller firing together on a cache miss) await
+        the same task instead of issuing duplicate Porsche API calls.
+        """
+        task = self._inflight
+        if task is None:
+            task = self._inflight = asyncio.create_task(
+                self._fetch_overview_with_retry(force_refresh=force_refresh)
+            )
+            try:
+                return await task
+            finally:
+                self._inflight = None
+        return await task
+
+    async def _fetch_overview_with_retry(self, force_refresh: bool = False):
         """Calls get_current_overview with retry logic for timeouts and rate limits."""
         max_retries = 3
         for attempt in range(max_retries):
             try:
                 overview = await self.vehicle.get_current_overview()
+                self._last_overview_ts = time.monotonic()
+                self._record_status_snapshot()
                 return overview
             except KeyError as e:
                 if "CHARGING_SUMMARY" in str(e) and attempt < max_retries - 1:
-                    wait_time = 2 ** (attempt + 1)
-                    logger.warning(f"Incomplete data from Porsche API (missing {e}). Retrying in {wait_time}s... (Attempt {attempt + 1}/{max_retries})")
-                    await asyncio.sleep(wait_time)
+                    logger.warning(f"Incomplete data from Porsche API (missing {e}). Retrying... (Attempt {attempt + 1}/{max_retries})")
+                    await _backoff_sleep(_TRANSIENT_DELAYS, attempt)
                 else:
                     logger.error(f"Failed to get vehicle overview due to missing key {e} after {attempt + 1} attempts.")
                     raise
@@ -170,19 +270,97 @@ class PorscheService:
                 
                 # Handle rate limiting (429 Too Many Requests)
                 if status_code == 429 and attempt < max_retries - 1:
-                    # Use longer backoff for rate limits
-                    wait_time = 30 * (attempt + 1)  # 30s, 60s, 90s
-                    logger.warning(f"Rate limit exceeded (429 Too Many Requests). Waiting {wait_time}s before retry... (Attempt {attempt + 1}/{max_retries})")
-                    await asyncio.sleep(wait_time)
+                    logger.warning(f"Rate limit exceeded (429 Too Many Requests). Backing off before retry... (Attempt {attempt + 1}/{max_retries})")
+                    await _backoff_sleep(_RATE_LIMIT_DELAYS, attempt)
                 # Handle gateway timeout (504)
                 elif status_code == 504 and attempt < max_retries - 1:
-                    wait_time = 2 ** (attempt + 1)  # Exponential backoff: 2, 4 seconds
-                    logger.warning(f"Gateway timeout from Porsche API. Retrying in {wait_time}s... (Attempt {attempt + 1}/{max_retries})")
-                    await asyncio.sleep(wait_time)
+                    logger.warning(f"Gateway timeout from Porsche API. Retrying... (Attempt {attempt + 1}/{max_retries})")
+                    await _backoff_sleep(_TRANSIENT_DELAYS, attempt)
                 else:
                     logger.error(f"Failed to get vehicle overview after {attempt + 1} attempts. Status code: {status_code}")
                     raise e
     
+    def _record_status_snapshot(self):
+        """Buffer a status row from the freshly fetched overview.
+
+        Rows are plain column dicts, not ORM objects; they are written in
+        one INSERT per flush instead of one commit per refresh.
+        """
+        data = self.vehicle.data
+        self._status_buffer.append({
+            # captured now, not at flush time, so buffered rows keep order
+            "timestamp": datetime.now(),
+            "vin": self.vehicle.vin,
+            "battery_level": (data.get('BATTERY_LEVEL') or {}).get('percent'),
+            "battery_charging_state": str(data.get('BATTERY_CHARGING_STATE')),
+            "estimated_range": (data.get('E_RANGE') or {}).get('kilometers'),
+            "raw_data": data,
+        })
+        if (len(self._status_buffer) >= self.STATUS_FLUSH_MAX
+                or time.monotonic() - self._last_status_flush > self.STATUS_FLUSH_INTERVAL):
+            asyncio.create_task(self.flush_status_buffer())
+
+    async def flush_status_buffer(self):
+        """Write any buffered status snapshots with a single bulk insert."""
+        if not self._status_buffer:
+            return
+        rows, self._status_buffer = self._status_buffer, []
+        self._last_status_flush = time.monotonic()
+        try:
+            await bulk_save_vehicle_status(rows)
+            logger.debug(f"Flushed {len(rows)} vehicle status snapshots")
+        except Exception as e:
+            logger.error(f"Failed to flush vehicle status snapshots: {e}")
+
+    async def _apply_target_soc(self, services: RemoteServices, target_soc: int) -> bool:
+        """Set the charge target SoC, tolerating failure.
+
+        Shared by start_charging and stop_charging; returns True when the
+        command reported success. Failures are logged and swallowed because
+        both callers proceed with the charge command regardless.
+        """
+        if not hasattr(services, 'update_charging_setting'):
+            logger.error("`update_charging_setting` method not found in RemoteServices. Cannot set target SoC. Please check pyporscheconnectapi library.")
+            return False
+
+        try:
+            logger.info(f"Calling update_charging_setting with target_soc={target_soc}...")
+            update_result = await services.update_charging_setting(target_soc=target_soc)
+            if update_result and _is_ok(update_result):
+                logger.info(f"Successfully set target SoC to {target_soc}%. Waiting 5 seconds...")
+                await asyncio.sleep(5)  # Wait for setting to apply
+                return True
+
+            status = getattr(update_result, 'status', 'N/A')
+            message = getattr(update_result, 'message', 'N/A')
+            logger.warning(f"Call to update_charging_setting did not return SUCCESS. Status: '{status}', Message: '{message}'. Proceeding anyway.")
+            await asyncio.sleep(2)  # Shorter wait if it didn't succeed
+        except Exception as e:
+            logger.error(f"Error during update_charging_setting: {e}. Proceeding anyway.")
+        return False
+
+    async def _wait_for_charging_state(self, expect_charging: bool, timeout: int = 10):
+        """Poll the overview until BATTERY_CHARGING_STATE reflects the requested
+        transition, for at most `timeout` seconds.
+
+        Replaces the old fixed 10s sleep: propagation usually takes 2-3s,
+        so returning as soon as the state matches cuts the user-visible wait.
+        """
+        for _ in range(timeout):
+            await asyncio.sleep(1)
+            try:
+                await self._get_overview_with_retry()
+            except Exception as verify_err:
+                logger.error(f"Error verifying charging status: {verify_err}")
+                return
+            state = str(self.vehicle.data.get('BATTERY_CHARGING_STATE')).upper()
+            if (state == 'CHARGING') == expect_charging:
+                break
+
+        charging_state = self.vehicle.data.get('BATTERY_CHARGING_STATE')
+        battery_level = self.vehicle.data.get('BATTERY_LEVEL', {}).get('percent')
+        logger.info(f"Current charging state: {charging_state}, Battery level: {battery_level}%")
+
     async def start_charging(self) -> bool:
         """Start charging the vehicle"""
         if not self.vehicle:
@@ -198,43 +376,19 @@ class PorscheService:
             target_soc = 100  # Using 100% as requested for testing instead of settings.TARGET_SOC
             logger.info(f"Setting target SoC to {target_soc}% before starting charge")
             
-            if not hasattr(services, 'update_charging_setting'):
-                logger.error("`update_charging_setting` method not found in RemoteServices. Cannot set target SoC. Please check pyporscheconnectapi library.")
-            else:
-                try:
-                    logger.info(f"Calling update_charging_setting with target_soc={target_soc}...")
-                    update_result = await services.update_charging_setting(target_soc=target_soc)
-                    if update_result and getattr(update_result, 'status', None) in ['SUCCESS', 'PERFORMED']:
-                        logger.info(f"Successfully set target SoC to {target_soc}%. Waiting 5 seconds...")
-                        await asyncio.sleep(5)  # Wait for setting to apply
-                    else:
-                        status = getattr(update_result, 'status', 'N/A')
-                        message = getattr(update_result, 'message', 'N/A')
-                        logger.warning(f"Call to update_charging_setting did not return SUCCESS. Status: '{status}', Message: '{message}'. Proceeding to start charge anyway.")
-                        await asyncio.sleep(2)  # Shorter wait if it didn't succeed
-                except Exception as e:
-                    logger.error(f"Error during update_charging_setting: {e}. Proceeding to start charge.")
-            
+            await self._apply_target_soc(services, target_soc)
+
             # Start charging
             logger.info("Sending command to start charging...")
             result = await services.direct_charge_on()
             
             # Final verification
-            if result and getattr(result, 'status', None) in ['SUCCESS', 'PERFORMED']:
-                logger.info("Successfully sent 'Start charging' command. Verifying status in 10 seconds...")
-                await asyncio.sleep(10)  # Give more time for the change to propagate
-                
-                # Verify the charging status
-                try:
-                    await self._get_overview_with_retry()
-                    charging_state = self.vehicle.data.get('BATTERY_CHARGING_STATE')
-                    battery_level = self.vehicle.data.get('BATTERY_LEVEL', {}).get('percent')
-                    logger.info(f"Current charging state: {charging_state}, Battery level: {battery_level}%")
-                    return True
-                except Exception as verify_err:
-                    logger.error(f"Error verifying charging status: {verify_err}")
-                    # Still return True since the command was successful
-                    return True
+            if result and _is_ok(result):
+                logger.info("Successfully sent 'Start charging' command. Verifying status in background...")
+                # The command is acknowledged; verify asynchronously so the
+                # caller isn't held up for the ~10s propagation window
+                asyncio.create_task(self._wait_for_charging_state(expect_charging=True))
+                return True
             else:
                 status = getattr(result, 'status', 'N/A')
                 message = getattr(result, 'message', 'N/A')
@@ -259,8 +413,11 @@ class PorscheService:
             logger.info("Sending command to stop charging (with force=True to override schedules)...")
             logger.info("Attempting to clear schedule by setting target SoC to current level, then stopping charge.")
             
-            # Refresh vehicle data
-            await self._get_overview_with_retry()
+            # Refresh vehicle data, unless a recent overview already has the SoC
+            if time.monotonic() - self._last_overview_ts > 30:
+                await self._get_overview_with_retry()
+            else:
+                logger.info("Using recently fetched vehicle overview for current SoC.")
             current_soc = self.vehicle.data.get('BATTERY_LEVEL', {}).get('percent')
             
             if current_soc is None:
@@ -271,43 +428,19 @@ class PorscheService:
                 # Ensure target_soc is within the library's accepted range (25-100)
                 target_update_soc = min(max(int(current_soc), 25), 100)
             
-            if not hasattr(services, 'update_charging_setting'):
-                logger.error("`update_charging_setting` method not found in RemoteServices. Cannot attempt to clear schedule. Please check pyporscheconnectapi library.")
-            else:
-                try:
-                    logger.info(f"Calling update_charging_setting with target_soc={target_update_soc}...")
-                    update_result = await services.update_charging_setting(target_soc=target_update_soc)
-                    if update_result and getattr(update_result, 'status', None) in ['SUCCESS', 'PERFORMED']:
-                        logger.info(f"Successfully called update_charging_setting. Waiting 5 seconds...")
-                        await asyncio.sleep(5)
-                    else:
-                        status = getattr(update_result, 'status', 'N/A')
-                        message = getattr(update_result, 'message', 'N/A')
-                        logger.warning(f"Call to update_charging_setting did not return SUCCESS. Status: '{status}', Message: '{message}'. Proceeding to stop charge anyway.")
-                        await asyncio.sleep(2)  # Shorter wait if it didn't succeed
-                except Exception as e:
-                    logger.error(f"Error during update_charging_setting: {e}. Proceeding to stop charge.")
-            
+            await self._apply_target_soc(services, target_update_soc)
+
             # Proceed to send direct_charge_off command
             logger.info("Proceeding to send direct_charge_off command.")
             result = await services.direct_charge_off()  # The library doesn't support force=True parameter
             
             # Final verification
-            if result and getattr(result, 'status', None) in ['SUCCESS', 'PERFORMED']:
-                logger.info("Successfully sent 'Stop charging' command. Verifying status in 10 seconds...")
-                await asyncio.sleep(10)  # Give more time for the change to propagate
-                
-                # Verify the charging status
-                try:
-                    await self._get_overview_with_retry()
-                    charging_state = self.vehicle.data.get('BATTERY_CHARGING_STATE')
-                    battery_level = self.vehicle.data.get('BATTERY_LEVEL', {}).get('percent')
-                    logger.info(f"Current charging state: {charging_state}, Battery level: {battery_level}%")
-                    return True
-                except Exception as verify_err:
-                    logger.error(f"Error verifying charging status: {verify_err}")
-                    # Still return True since the command was successful
-                    return True
+            if result and _is_ok(result):
+                logger.info("Successfully sent 'Stop charging' command. Verifying status in background...")
+                # The command is acknowledged; verify asynchronously so the
+                # caller isn't held up for the ~10s propagation window
+                asyncio.create_task(self._wait_for_charging_state(expect_charging=False))
+                return True
             else:
                 status = getattr(result, 'status', 'N/A')
                 message = getattr(result, 'message', 'N/A')
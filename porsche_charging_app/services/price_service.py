@@ -1,24 +1,41 @@
+import time
+import orjson
+import atexit
+import bisect
 import logging
+import functools
 import httpx
 import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from sqlalchemy import select
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-import json
 import os
 from pathlib import Path
 import base64
 import io
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 
 from ..core.config import settings
 from ..models.db import get_db_session, Price, Configuration
 
 logger = logging.getLogger(__name__)
 
+# Amber interval types that belong on the forecast chart
+_FORECAST_TYPES = frozenset(("CurrentInterval", "ForecastInterval"))
+
 class PriceService:
     """Service for fetching and managing electricity prices"""
-    
+
+    # How long fetched Amber prices stay fresh, in seconds
+    PRICES_CACHE_TTL = 300
+    # How long an expired cache may still be served when Amber is down
+    PRICES_MAX_STALE = 30 * 60
+    # Minimum seconds between price_cache.json writes
+    CACHE_SAVE_INTERVAL = 60
+    # 24 hours of history at 5-minute intervals
+    HISTORY_MAXLEN = 288
+
     def __init__(self):
         # Amber API settings
         self.amber_api_key = settings.AMBER_API_KEY
@@ -30,53 +47,244 @@ class PriceService:
         self.api_key = settings.PRICE_API_KEY
         
         self.cache_file = Path("price_cache.json")
-        self.price_history = []
+        self.price_history = deque(maxlen=self.HISTORY_MAXLEN)
+        # Parsed timestamp of the newest history entry, so freshness checks
+        # don't re-run fromisoformat on every price poll
+        self._last_price_dt: Optional[datetime] = None
+        self._client = None  # shared HTTP client, created on first use
+        self._generic_client = None  # separate client for the fallback API
+        self._cache_dirty = False
+        self._last_save_monotonic = 0.0
         self._load_cache()
+        # Flush any debounced cache writes when the process exits
+        atexit.register(self._flush_cache)
+        # Cache freshness is tracked as monotonic deadlines: one float
+        # compare on the hot path instead of datetime arithmetic
         self._amber_prices_cache = None
-        self._amber_prices_cache_timestamp = None
+        self._amber_prices_deadline = 0.0
+        self._amber_prices_hard_deadline = 0.0
         self._live_prices_cache = None
-        self._live_prices_cache_timestamp = None
+        self._live_prices_deadline = 0.0
+        self._live_prices_hard_deadline = 0.0
+        self._refresher_task = None
+        # In-flight fetches by key; concurrent callers share one request
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        # Configuration rows change rarely but are read on every price
+        # check; cache them and invalidate through set_config_value
+        self._config_cache: Dict[str, Optional[str]] = {}
+        # Sliding-window pacer state for _acquire_amber_slot
+        self._amber_call_times: deque = deque()
+        self._rate_lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def _session(self):
+        """Database session with guaranteed close.
+
+        One place for the open/close discipline instead of each DB helper
+        repeating (or forgetting) its own try/finally.
+        """
+        session = get_db_session()
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    async def _single_flight(self, key, coro_factory):
+        """Coalesce concurrent identical fetches.
+
+        The first caller for a key runs the coroutine; callers arriving
+        while it is in flight (dashboard poll + chart endpoint + controller
+        tick) await the same future instead of issuing duplicate Amber
+        requests, which also keeps bursty clients clear of rate limits.
+        """
+        existing = self._inflight.get(key)
+        if existing is not None:
+            return await existing
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await coro_factory()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when no joiner awaits it
+            raise
+        finally:
+            # Cancellation (client disconnect, shutdown) is a BaseException
+            # and skips the except above; resolve the future regardless so
+            # joiners are never left awaiting forever
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it lazily.
+
+        One long-lived client keeps connections alive between Amber calls,
+        avoiding a fresh TCP+TLS handshake per request. The Amber base URL
+        and auth header are defaults on the client, so call sites pass
+        relative paths. Amber-only: the default bearer token must never
+        ride along to other hosts (see _get_generic_client).
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.amber_base_url,
+                headers={
+                    "Authorization": f"Bearer {self.amber_api_key}",
+                    "Accept": "application/json",
+                },
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=httpx.Timeout(10.0),
+                # One TLS handshake multiplexes concurrent Amber calls;
+                # gzip negotiation is httpx's default
+                http2=True,
+            )
+        return self._client
+
+    def _get_generic_client(self) -> httpx.AsyncClient:
+        """Return the client for the generic fallback price API.
+
+        Kept separate from the Amber client, which carries the Amber
+        bearer token as a default header: httpx merges client and request
+        headers per key, so reusing it would send the Amber credential to
+        the third-party host whenever PRICE_API_KEY is unset.
+        """
+        if self._generic_client is None or self._generic_client.is_closed:
+            self._generic_client = httpx.AsyncClient(
+                headers={"Accept": "application/json"},
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=2),
+                timeout=httpx.Timeout(10.0),
+            )
+        return self._generic_client
+
+    def start_refresher(self):
+        """Start the background cache refresher (called on app startup)."""
+        if self._refresher_task is None or self._refresher_task.done():
+            self._refresher_task = asyncio.create_task(self._periodic_refresh())
+        # Warm the site ID (usually from the Configuration table) so the
+        # first price request doesn't pay for it
+        asyncio.create_task(self._get_amber_site_id())
+
+    async def _periodic_refresh(self):
+        """Re-fetch the Amber prices shortly before the cache expires.
+
+        User requests then always land on a warm cache; the miss latency
+        is paid here, off any request path.
+        """
+        while True:
+            await asyncio.sleep(self.PRICES_CACHE_TTL - 60)
+            try:
+                await self._single_flight(
+                    ("amber", 12), lambda: self._fetch_amber_prices(12, force=True)
+                )
+            except Exception as e:
+                logger.error(f"Background Amber price refresh failed: {e}")
+
+    async def close(self):
+        """Close the shared HTTP client (called on app shutdown)."""
+        if self._refresher_task is not None:
+            self._refresher_task.cancel()
+            self._refresher_task = None
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        if self._generic_client is not None and not self._generic_client.is_closed:
+            await self._generic_client.aclose()
+        self._flush_cache()
+
     def _load_cache(self):
         """Load cached price data"""
+        # EAFP: read directly and let a missing file fall through
         try:
-            if self.cache_file.exists():
-                with open(self.cache_file, "r") as f:
-                    cache_data = json.load(f)
-                    self.price_history = cache_data.get("history", [])
-                    logger.info(f"Loaded {len(self.price_history)} price points from cache")
+            cache_data = orjson.loads(self.cache_file.read_bytes())
+            # Bounded deque: appends evict the oldest point in O(1)
+            self.price_history = deque(cache_data.get("history", []), maxlen=self.HISTORY_MAXLEN)
+            if self.price_history:
+                try:
+                    self._last_price_dt = datetime.fromisoformat(
+                        self.price_history[-1]["timestamp"]
+                    )
+                except (KeyError, ValueError):
+                    self._last_price_dt = None
+            logger.info(f"Loaded {len(self.price_history)} price points from cache")
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.error(f"Failed to load price cache: {e}")
-            self.price_history = []
+            self.price_history = deque(maxlen=self.HISTORY_MAXLEN)
     
-    async def _get_site_id(self):
-        """Fetch the first site ID from the Amber API."""
-        if self.site_id:
-            return
-        if not self.amber_api_key:
-            logger.error("Amber API key not set, cannot get site ID.")
-            return
-        
-        headers = {"Authorization": f"Bearer {self.amber_api_key}", "Accept": "application/json"}
-        url = f"{self.amber_base_url}/sites"
-        
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                sites = response.json()
-                if sites and isinstance(sites, list) and len(sites) > 0:
-                    self.site_id = sites[0]['id']
-                    logger.info(f"Found Amber site ID: {self.site_id}")
-                else:
-                    logger.error("No sites found for this Amber account.")
-        except Exception as e:
-            logger.error(f"Failed to get Amber site ID: {e}")
+    async def _amber_get(self, path: str, params: Optional[Dict[str, Any]] = None,
+                         timeout: Optional[float] = None):
+        """GET an Amber endpoint via the shared client, parsed with orjson.
+
+        One choke point for Amber HTTP: every fetcher picks up the pooled
+        client, default headers and any future pacing from here.
+        """
+        await self._acquire_amber_slot()
+        kwargs: Dict[str, Any] = {}
+        if params:
+            kwargs["params"] = params
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = await self._get_client().get(path, **kwargs)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    async def _acquire_amber_slot(self):
+        """Pace Amber calls to at most AMBER_MAX_RPS per sliding second.
+
+        Cooperating pollers plus uncached error paths can otherwise burst
+        past Amber's allowance; a 429 lockout would cascade into empty
+        responses and threshold-fallback charging decisions.
+        """
+        async with self._rate_lock:
+            while True:
+                now = time.monotonic()
+                window = self._amber_call_times
+                while window and now - window[0] >= 1.0:
+                    window.popleft()
+                if len(window) < settings.AMBER_MAX_RPS:
+                    window.append(now)
+                    return
+                await asyncio.sleep(1.0 - (now - window[0]))
+
+    def _stale_amber_prices(self) -> Optional[List[Dict[str, Any]]]:
+        """Expired-but-usable Amber cache, or None past PRICES_MAX_STALE.
+
+        Stale-while-revalidate: a bounded-stale forecast keeps the chart and
+        charging decisions running through an Amber outage, where returning
+        [] would blank them.
+        """
+        now = time.monotonic()
+        if self._amber_prices_cache and now < self._amber_prices_hard_deadline:
+            age = self.PRICES_MAX_STALE - (self._amber_prices_hard_deadline - now)
+            logger.warning(f"Amber fetch failed; serving stale prices ({age:.0f}s old).")
+            return self._amber_prices_cache
+        return None
+
+    def _stale_live_prices(self) -> Optional[Dict[str, Optional[float]]]:
+        """Expired-but-usable live price cache (see _stale_amber_prices)."""
+        now = time.monotonic()
+        if self._live_prices_cache and now < self._live_prices_hard_deadline:
+            age = self.PRICES_MAX_STALE - (self._live_prices_hard_deadline - now)
+            logger.warning(f"Amber fetch failed; serving stale live prices ({age:.0f}s old).")
+            return self._live_prices_cache
+        return None
+
+    def _price_fallback(self) -> float:
+        """Best available price when the APIs fail: the last cached price
+        while it is younger than PRICES_MAX_STALE, else the threshold."""
+        if self.price_history:
+            latest = self.price_history[-1]
+            timestamp = self._last_price_dt or datetime.fromisoformat(latest["timestamp"])
+            if (datetime.now() - timestamp) < timedelta(seconds=self.PRICES_MAX_STALE):
+                logger.warning(f"Price fetch failed; using last known price {latest['price']}.")
+                return latest["price"]
+        return self.get_price_threshold()
 
     async def get_amber_prices(self, hours: int = 12) -> List[Dict[str, Any]]:
         """Fetch upcoming electricity prices from Amber API."""
-        if (self._amber_prices_cache and self._amber_prices_cache_timestamp and
-                (datetime.now() - self._amber_prices_cache_timestamp) < timedelta(minutes=5)):
+        if self._amber_prices_cache and time.monotonic() < self._amber_prices_deadline:
             logger.info("Returning cached Amber prices.")
             return self._amber_prices_cache
 
@@ -84,54 +292,82 @@ class PriceService:
             logger.warning("Amber API key not configured. Cannot fetch prices.")
             return []
 
-        await self._get_site_id()
+        return await self._single_flight(
+            ("amber", hours), lambda: self._fetch_amber_prices(hours)
+        )
+
+    async def _fetch_amber_prices(self, hours: int, force: bool = False) -> List[Dict[str, Any]]:
+        # Double-check under single-flight: a caller that just finished may
+        # have refreshed the cache while we waited for the future slot
+        if (not force and self._amber_prices_cache
+                and time.monotonic() < self._amber_prices_deadline):
+            return self._amber_prices_cache
+
+        await self._get_amber_site_id()
         if not self.site_id:
             return []
 
         try:
-            headers = {
-                "Authorization": f"Bearer {self.amber_api_key}",
-                "Accept": "application/json"
-            }
             # Calculate number of 30-minute periods to fetch
             num_periods = (hours * 60) // 30
 
-            async with httpx.AsyncClient() as client:
-                url = f"{self.amber_base_url}/sites/{self.site_id}/prices/current?next={num_periods}&resolution=30"
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                raw_data = response.json()
-
-                # Filter for current and forecast data and transform to the format expected by the frontend
-                transformed_data = [
-                    {
-                        "timestamp": item.get("nemTime"),
-                        "price": item.get("perKwh")
-                    }
-                    for item in raw_data
-                    if item.get('type') in ['CurrentInterval', 'ForecastInterval'] 
-                    and item.get("perKwh") is not None
-                    and item.get("channelType") == "general"
-                ]
-                
-                self._amber_prices_cache = transformed_data
-                self._amber_prices_cache_timestamp = datetime.now()
-                logger.info(f"Cached {len(transformed_data)} new Amber price points.")
+            raw_data = await self._amber_get(
+                f"/sites/{self.site_id}/prices/current",
+                params={"next": num_periods, "resolution": 30},
+            )
+
+            # Filter for current and forecast data and transform to the
+            # format expected by the frontend. The .get bind and frozenset
+            # membership keep per-item overhead down on long horizons.
+            transformed_data = []
+            for item in raw_data:
+                g = item.get
+                if g('type') in _FORECAST_TYPES and g("channelType") == "general":
+                    price = g("perKwh")
+                    if price is not None:
+                        transformed_data.append({"timestamp": g("nemTime"), "price": price})
+
+            self._amber_prices_cache = transformed_data
+            self._amber_prices_deadline = time.monotonic() + self.PRICES_CACHE_TTL
+            self._amber_prices_hard_deadline = time.monotonic() + self.PRICES_MAX_STALE
+            logger.info(f"Cached {len(transformed_data)} new Amber price points.")
 
-                return transformed_data
+            return transformed_data
 
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error fetching Amber prices: {e.response.status_code} - {e.response.text}")
-            return []
+            return self._stale_amber_prices() or []
         except Exception as e:
             logger.error(f"Error fetching Amber prices: {e}")
-            return []
+            return self._stale_amber_prices() or []
+
+    def _maybe_save_cache(self):
+        """Mark the cache dirty and persist at most once per interval.
+
+        Rewriting the whole history file on every price fetch burns disk
+        I/O for no benefit; the debounce bounds it to one write a minute,
+        with the atexit flush covering whatever is still pending.
+        """
+        self._cache_dirty = True
+        if time.monotonic() - self._last_save_monotonic > self.CACHE_SAVE_INTERVAL:
+            self._save_cache()
+
+    def _flush_cache(self):
+        """Write out any pending cache changes (atexit/shutdown hook)."""
+        if self._cache_dirty:
+            self._save_cache()
 
     def _save_cache(self):
         """Save price data to cache"""
         try:
-            with open(self.cache_file, "w") as f:
-                json.dump({"history": self.price_history}, f, indent=2)
+            # Write-then-rename so a crash mid-write can't tear the file
+            tmp = self.cache_file.with_suffix(".tmp")
+            tmp.write_bytes(
+                orjson.dumps({"history": list(self.price_history)}, option=orjson.OPT_INDENT_2)
+            )
+            tmp.replace(self.cache_file)
+            self._cache_dirty = False
+            self._last_save_monotonic = time.monotonic()
             logger.info(f"Saved {len(self.price_history)} price points to cache")
         except Exception as e:
             logger.error(f"Failed to save price cache: {e}")
@@ -140,37 +376,39 @@ class PriceService:
         """Get the current electricity price"""
         try:
             # Check for mock price override first
-            mock_price = self.get_mock_price()
+            mock_price = await self.get_mock_price()
             if mock_price is not None:
                 logger.info(f"Using mock price override: {mock_price}")
                 return mock_price
 
+            # One wall-clock read per call; reused for the freshness check,
+            # the DB row and the history entry so they all agree
+            now = datetime.now()
+
             # Check if we have a recent price in the cache (less than 5 minutes old)
             if self.price_history:
                 latest = self.price_history[-1]
-                timestamp = datetime.fromisoformat(latest["timestamp"])
-                if (datetime.now() - timestamp) < timedelta(minutes=5):
+                timestamp = self._last_price_dt or datetime.fromisoformat(latest["timestamp"])
+                if (now - timestamp) < timedelta(minutes=5):
                     logger.info(f"Using cached price: {latest['price']}")
                     return latest["price"]
-            
+
             # Fetch new price from API
             price = await self._fetch_price_from_api()
-            
-            # Store in database
-            self._store_price_in_db(price)
-            
+
+            # Store in database without holding up the caller; the insert
+            # already runs on the async engine and logs its own failures
+            asyncio.create_task(self._store_price_in_db(price, timestamp=now))
+
             # Update cache
             self.price_history.append({
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
                 "price": price
             })
-            
-            # Trim history to keep only the last 24 hours (288 points at 5-minute intervals)
-            if len(self.price_history) > 288:
-                self.price_history = self.price_history[-288:]
-            
-            # Save cache
-            self._save_cache()
+            self._last_price_dt = now
+
+            # Save cache (debounced)
+            self._maybe_save_cache()
             
             return price
         
@@ -196,7 +434,7 @@ class PriceService:
         logger = logging.getLogger(__name__)
         
         # First check if we should use a mock price
-        mock_price = self.get_mock_price()
+        mock_price = await self.get_mock_price()
         if mock_price is not None:
             logger.info(f"Using mock price: {mock_price} c/kWh")
             return mock_price
@@ -204,15 +442,14 @@ class PriceService:
         # If we have a generic API URL configured, use that
         if self.api_url:
             try:
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    headers = {}
-                    if self.api_key:
-                        headers["Authorization"] = f"Bearer {self.api_key}"
-                    response = await client.get(self.api_url, headers=headers)
-                    response.raise_for_status()
-                    data = response.json()
-                    price = float(data.get("price", 0.0)) # Assuming cents
-                    return price
+                headers = {}
+                if self.api_key:
+                    headers["Authorization"] = f"Bearer {self.api_key}"
+                response = await self._get_generic_client().get(self.api_url, headers=headers, timeout=timeout)
+                response.raise_for_status()
+                data = orjson.loads(response.content)
+                price = float(data.get("price", 0.0)) # Assuming cents
+                return price
             except (httpx.ConnectTimeout, httpx.ReadTimeout) as e:
                 logger.error(f"Timeout connecting to generic API: {e}")
                 logger.warning("Falling back to Amber API due to generic API timeout.")
@@ -230,35 +467,32 @@ class PriceService:
                         await self._get_amber_site_id()
                     except Exception as e:
                         logger.error(f"Failed to get Amber site ID: {e}")
-                        return self.get_price_threshold()
+                        return self._price_fallback()
                 
                 if not self.site_id:
                     logger.error("Failed to get Amber site ID, returning threshold.")
-                    return self.get_price_threshold()
+                    return self._price_fallback()
                 
-                headers = {"Authorization": f"Bearer {self.amber_api_key}"}
-                url = f"{self.amber_base_url}/sites/{self.site_id}/prices/current"
-                
-                async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
-                    response = await client.get(url)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if data and isinstance(data, list) and len(data) > 0:
-                        general_prices = [p for p in data if p.get('channelType') == 'general']
-                        if not general_prices:
-                            logger.warning("No 'general' channel prices found in Amber API response.")
-                            return self.get_price_threshold()
-
-                        sorted_prices = sorted(general_prices, key=lambda x: x.get('nemTime', ''), reverse=True)
-                        current_price_data = sorted_prices[0]
-                        
-                        price_in_cents = current_price_data.get('perKwh', 0.0)
-                        logger.info(f"Current price from API: {price_in_cents} c/kWh")
-                        return price_in_cents
-                    else:
-                        logger.warning("No price data returned from Amber API")
-                        return self.get_price_threshold()
+                data = await self._amber_get(
+                    f"/sites/{self.site_id}/prices/current", timeout=timeout
+                )
+
+                if data and isinstance(data, list) and len(data) > 0:
+                    general_prices = [p for p in data if p.get('channelType') == 'general']
+                    if not general_prices:
+                        logger.warning("No 'general' channel prices found in Amber API response.")
+                        return self._price_fallback()
+
+                    # Only the newest interval matters; a single-pass max
+                    # beats sorting the whole response
+                    current_price_data = max(general_prices, key=lambda x: x.get('nemTime') or '')
+
+                    price_in_cents = current_price_data.get('perKwh', 0.0)
+                    logger.info(f"Current price from API: {price_in_cents} c/kWh")
+                    return price_in_cents
+                else:
+                    logger.warning("No price data returned from Amber API")
+                    return self._price_fallback()
                         
             except (httpx.ConnectTimeout, httpx.ReadTimeout) as e:
                 retry_count += 1
@@ -268,10 +502,10 @@ class PriceService:
                     await asyncio.sleep(wait_time)
                 else:
                     logger.error(f"Connection timeout to Amber API after {max_retries} retries: {e}")
-                    return self.get_price_threshold()
+                    return self._price_fallback()
             except httpx.HTTPStatusError as e:
                 logger.error(f"HTTP error from Amber API: {e.response.status_code} - {e.response.text}")
-                return self.get_price_threshold()
+                return self._price_fallback()
             except httpx.RequestError as e:
                 logger.error(f"Request error to Amber API: {e}")
                 retry_count += 1
@@ -280,58 +514,62 @@ class PriceService:
                     logger.warning(f"Request error (attempt {retry_count}/{max_retries}). Retrying in {wait_time}s...")
                     await asyncio.sleep(wait_time)
                 else:
-                    return self.get_price_threshold()
+                    return self._price_fallback()
             except Exception as e:
                 logger.error(f"Failed to fetch price from Amber API: {e}", exc_info=True)
                 logger.warning("Falling back to price threshold due to API error.")
-                return self.get_price_threshold()
+                return self._price_fallback()
     
-    def _store_price_in_db(self, price: float):
+    async def _store_price_in_db(self, price: float, timestamp: Optional[datetime] = None):
         """Store the price in the database"""
         try:
-            session = get_db_session()
-            price_record = Price(
-                timestamp=datetime.now(),
-                value=price
-            )
-            session.add(price_record)
-            session.commit()
+            async with self._session() as session:
+                price_record = Price(
+                    timestamp=timestamp or datetime.now(),
+                    value=price
+                )
+                session.add(price_record)
+                await session.commit()
         except Exception as e:
             logger.error(f"Failed to store price in database: {e}")
     
     async def _get_amber_site_id(self) -> Optional[str]:
         """Get the user's site ID from Amber API"""
+        if self.site_id:
+            return self.site_id
+        return await self._single_flight("site", self._fetch_amber_site_id)
+
+    async def _fetch_amber_site_id(self) -> Optional[str]:
         try:
             if not self.amber_api_key or self.amber_api_key.strip() == "":
                 logger.error("Amber API key is empty or not configured")
                 return None
-                
-            headers = {"Authorization": f"Bearer {self.amber_api_key}"}
-            url = f"{self.amber_base_url}/sites"
-            
-            async with httpx.AsyncClient(headers=headers) as client:
-                response = await client.get(url)
-                response.raise_for_status()
-                
-                sites = response.json()
-                
-                if sites and len(sites) > 0:
-                    # Use the first site ID
-                    self.site_id = sites[0].get('id')
-                    logger.info(f"Using Amber site ID: {self.site_id}")
-                    return self.site_id
-                else:
-                    logger.warning("No sites found in Amber account")
-                    return None
-                    
+
+            # Reuse a persisted site ID before paying the /sites round-trip
+            stored = await self.get_config_value("amber_site_id")
+            if stored:
+                self.site_id = stored
+                return stored
+
+            sites = await self._amber_get("/sites")
+
+            if sites and len(sites) > 0:
+                # Use the first site ID
+                self.site_id = sites[0].get('id')
+                logger.info(f"Using Amber site ID: {self.site_id}")
+                await self.set_config_value("amber_site_id", self.site_id)
+                return self.site_id
+            else:
+                logger.warning("No sites found in Amber account")
+                return None
+
         except Exception as e:
             logger.error(f"Failed to get Amber site ID: {e}")
             return None
             
     async def get_live_prices(self) -> Dict[str, Optional[float]]:
         """Fetch the current live general and feed-in prices from the Amber Electric API"""
-        if (self._live_prices_cache and self._live_prices_cache_timestamp and
-                (datetime.now() - self._live_prices_cache_timestamp) < timedelta(minutes=5)):
+        if self._live_prices_cache and time.monotonic() < self._live_prices_deadline:
             logger.info("Returning cached live prices.")
             return self._live_prices_cache
 
@@ -339,6 +577,13 @@ class PriceService:
             logger.warning("Amber API key not configured. Cannot fetch live prices.")
             return {"general": None, "feed_in": None}
 
+        return await self._single_flight("live", self._fetch_live_prices)
+
+    async def _fetch_live_prices(self) -> Dict[str, Optional[float]]:
+        # Double-check under single-flight (see _fetch_amber_prices)
+        if self._live_prices_cache and time.monotonic() < self._live_prices_deadline:
+            return self._live_prices_cache
+
         try:
             if not self.site_id:
                 await self._get_amber_site_id()
@@ -347,39 +592,36 @@ class PriceService:
                 logger.error("Failed to get Amber site ID, cannot fetch live prices.")
                 return {"general": None, "feed_in": None}
             
-            headers = {"Authorization": f"Bearer {self.amber_api_key}"}
             # We only need the current price, so `next=1` should be sufficient.
-            url = f"{self.amber_base_url}/sites/{self.site_id}/prices/current?next=1"
-            
-            async with httpx.AsyncClient(headers=headers) as client:
-                response = await client.get(url)
-                response.raise_for_status()
-                data = response.json()
-                
-                live_prices = {"general": None, "feed_in": None}
-                
-                if data and isinstance(data, list):
-                    # The first item for each channelType is the current one
-                    for price_data in data:
-                        channel_type = price_data.get('channelType')
-                        price = price_data.get('perKwh')
-                        
-                        if channel_type == 'general' and live_prices['general'] is None:
-                            live_prices['general'] = price
-                        elif channel_type == 'feedIn' and live_prices['feed_in'] is None:
-                            live_prices['feed_in'] = price
-                    
-                    logger.info(f"Live prices from API: General={live_prices['general']}, Feed-in={live_prices['feed_in']}")
-                    self._live_prices_cache = live_prices
-                    self._live_prices_cache_timestamp = datetime.now()
-                    return live_prices
-                else:
-                    logger.warning("No live price data returned from Amber API")
-                    return live_prices
+            data = await self._amber_get(
+                f"/sites/{self.site_id}/prices/current", params={"next": 1}
+            )
+
+            live_prices = {"general": None, "feed_in": None}
+
+            if data and isinstance(data, list):
+                # The first item for each channelType is the current one
+                for price_data in data:
+                    channel_type = price_data.get('channelType')
+                    price = price_data.get('perKwh')
+
+                    if channel_type == 'general' and live_prices['general'] is None:
+                        live_prices['general'] = price
+                    elif channel_type == 'feedIn' and live_prices['feed_in'] is None:
+                        live_prices['feed_in'] = price
+
+                logger.info(f"Live prices from API: General={live_prices['general']}, Feed-in={live_prices['feed_in']}")
+                self._live_prices_cache = live_prices
+                self._live_prices_deadline = time.monotonic() + self.PRICES_CACHE_TTL
+                self._live_prices_hard_deadline = time.monotonic() + self.PRICES_MAX_STALE
+                return live_prices
+            else:
+                logger.warning("No live price data returned from Amber API")
+                return live_prices
         
         except Exception as e:
             logger.error(f"Failed to fetch live prices from Amber API: {e}", exc_info=True)
-            return {"general": None, "feed_in": None}
+            return self._stale_live_prices() or {"general": None, "feed_in": None}
             
 
             
@@ -393,26 +635,28 @@ class PriceService:
                     return amber_prices
             
             # Try to get from database if Amber API failed or not configured
-            session = get_db_session()
             cutoff = datetime.now() - timedelta(hours=hours)
-            
-            db_prices = session.query(Price).filter(
-                Price.timestamp >= cutoff
-            ).order_by(Price.timestamp).all()
-            
+            async with self._session() as session:
+                result = await session.execute(
+                    select(Price).where(Price.timestamp >= cutoff).order_by(Price.timestamp)
+                )
+                db_prices = result.scalars().all()
+
             if db_prices:
                 return [
                     {"timestamp": p.timestamp.isoformat(), "price": p.value}
                     for p in db_prices
                 ]
             
-            # Fall back to cache if database is empty
+            # Fall back to cache if database is empty. History is
+            # append-ordered by time, so binary-search the cutoff instead
+            # of filtering the whole window
             if self.price_history:
-                cutoff_iso = cutoff.isoformat()
-                return [
-                    p for p in self.price_history
-                    if p["timestamp"] >= cutoff_iso
-                ]
+                history = list(self.price_history)
+                idx = bisect.bisect_left(
+                    history, cutoff.isoformat(), key=lambda p: p["timestamp"]
+                )
+                return history[idx:]
             
             return []
         
@@ -420,31 +664,34 @@ class PriceService:
             logger.error(f"Error getting recent prices: {e}")
             return []
     
-    def get_config_value(self, key: str, default: Optional[Any] = None) -> Optional[str]:
-        session = get_db_session()
-        try:
-            config_item = session.query(Configuration).filter_by(key=key).first()
+    async def get_config_value(self, key: str, default: Optional[Any] = None) -> Optional[str]:
+        # All writes go through set_config_value, so the cache is
+        # authoritative once a key has been read or written
+        if key in self._config_cache:
+            return self._config_cache[key]
+        async with self._session() as session:
+            result = await session.execute(select(Configuration).filter_by(key=key))
+            config_item = result.scalars().first()
             if config_item:
+                self._config_cache[key] = config_item.value
                 return config_item.value
-            if default is not None:
-                self.set_config_value(key, str(default))
-                return str(default)
-            return None
-        finally:
-            session.close()
+        if default is not None:
+            await self.set_config_value(key, str(default))
+            return str(default)
+        self._config_cache[key] = None
+        return None
 
-    def set_config_value(self, key: str, value: str):
-        session = get_db_session()
-        try:
-            config_item = session.query(Configuration).filter_by(key=key).first()
+    async def set_config_value(self, key: str, value: str):
+        async with self._session() as session:
+            result = await session.execute(select(Configuration).filter_by(key=key))
+            config_item = result.scalars().first()
             if config_item:
                 config_item.value = value
             else:
                 config_item = Configuration(key=key, value=value)
                 session.add(config_item)
-            session.commit()
-        finally:
-            session.close()
+            await session.commit()
+            self._config_cache[key] = value
 
     def get_price_threshold(self) -> float:
         """Get the current price threshold for charging decisions from settings."""
@@ -461,9 +708,9 @@ class PriceService:
             logger.error(f"Failed to set price threshold: {e}")
             return False
 
-    def get_mock_price(self) -> Optional[float]:
+    async def get_mock_price(self) -> Optional[float]:
         """Get the mock price override from the database"""
-        price_str = self.get_config_value("mock_price", "")
+        price_str = await self.get_config_value("mock_price", "")
         if price_str is not None and price_str != "":
             try:
                 return float(price_str)
@@ -471,74 +718,88 @@ class PriceService:
                 return None
         return None
 
-    def set_mock_price(self, price: Optional[float]):
+    async def set_mock_price(self, price: Optional[float]):
         """Set the mock price override in the database. Set to None or empty string to disable."""
         value_to_set = str(price) if price is not None else ""
-        self.set_config_value("mock_price", value_to_set)
+        await self.set_config_value("mock_price", value_to_set)
         logger.info(f"Mock price override set to: {price}")
 
-# Singleton instance
-_price_service = None
-
+@functools.lru_cache(maxsize=1)
 def get_price_service() -> PriceService:
-    """Get the singleton instance of PriceService"""
-    global _price_service
-    if _price_service is None:
-        _price_service = PriceService()
-    return _price_service
+    """Get the singleton instance of PriceService.
 
-async def generate_price_chart(prices: List[Dict[str, Any]], hours: int = 12) -> str:
-    """Generate a chart of electricity prices and return as base64 encoded string"""
-    if not prices:
-        return ""
-        
-    # Check if we have an error message instead of actual price data
-    if len(prices) == 1 and "error" in prices[0]:
-        logger.error(f"Cannot generate price chart: {prices[0]['error']}")
-        return ""
-        
+    lru_cache construction is locked at the C level, so two first-callers
+    on different threads can't each build a service (and double-read the
+    price cache file); the check-then-set global it replaces could.
+    """
+    return PriceService()
+
+def _render_price_chart(prices: List[Dict[str, Any]], hours: int = 12) -> str:
+    """Synchronous matplotlib rendering; runs in a worker thread."""
     try:
-        # Extract timestamps and prices
+        # Deferred import: matplotlib is heavy and only needed for
+        # charting. The OO Figure/Agg API is used instead of pyplot:
+        # pyplot's global figure manager is not thread-safe, and two
+        # chart requests rendering on different executor threads through
+        # it could cross-contaminate plots or raise.
+        import matplotlib.dates as mdates
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        import numpy as np
+
+        # Extract timestamps and prices. Timestamps stay datetime objects:
+        # numpy's datetime64 cannot carry the AEST offset Amber sends and
+        # would silently shift the axis to UTC. Values go straight into a
+        # float array, which matplotlib takes without internal conversion.
         timestamps = [datetime.fromisoformat(price["timestamp"].replace("Z", "+00:00")) for price in prices]
-        price_values = [price["price"] for price in prices]
-        
-        # Create the figure and plot
-        plt.figure(figsize=(8, 3))
-        plt.plot(timestamps, price_values, marker='o', linestyle='-', color='#007bff', label='Price (c/kWh)')
-        plt.legend()
-        
-        # Format the plot
-        plt.gcf().autofmt_xdate()
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-        plt.ylabel('Price (c/kWh)')
-        plt.title(f'Electricity Prices - Next {hours} Hours')
-        plt.grid(True, alpha=0.3)
-        
+        price_values = np.fromiter(
+            (price["price"] for price in prices), dtype=np.float64, count=len(prices)
+        )
+
+        # Create the figure and plot; the figure is local to this call and
+        # garbage-collected with it, no pyplot registry to close
+        fig = Figure(figsize=(8, 3))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.plot(timestamps, price_values, marker='o', linestyle='-', color='#007bff', label='Price (c/kWh)')
+        ax.legend()
+
         # Format the plot
-        plt.gcf().autofmt_xdate()
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-        plt.ylabel('Price (c/kWh)')
-        plt.title(f'Electricity Prices - Next {hours} Hours')
-        plt.grid(True, alpha=0.3)
-        
-        # Save the plot to a BytesIO object
-        # Add legend
-        plt.legend()
-        
+        fig.autofmt_xdate()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+        ax.set_ylabel('Price (c/kWh)')
+        ax.set_title(f'Electricity Prices - Next {hours} Hours')
+        ax.grid(True, alpha=0.3)
+
         # Set y-axis to start from 0 or slightly below the minimum price
-        min_price = min(price_values) if price_values else 0
-        plt.ylim(bottom=max(0, min_price * 0.9))
-        
+        min_price = price_values.min() if price_values.size else 0
+        ax.set_ylim(bottom=max(0, min_price * 0.9))
+
         # Save to a bytes buffer
         buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight')
-        plt.close()
-        
+        fig.savefig(buf, format='png', bbox_inches='tight')
+
         # Convert to base64
         buf.seek(0)
         img_base64 = base64.b64encode(buf.read()).decode('utf-8')
         return img_base64
-        
+
     except Exception as e:
         logger.error(f"Failed to generate price chart: {e}")
         return ""
+
+async def generate_price_chart(prices: List[Dict[str, Any]], hours: int = 12) -> str:
+    """Generate a chart of electricity prices and return as base64 encoded string"""
+    if not prices:
+        return ""
+
+    # Check if we have an error message instead of actual price data
+    if len(prices) == 1 and "error" in prices[0]:
+        logger.error(f"Cannot generate price chart: {prices[0]['error']}")
+        return ""
+
+    # Rendering takes 100-300ms of pure CPU; run it in a worker thread so
+    # the event loop (and concurrent Amber polls) keep moving
+    return await asyncio.get_running_loop().run_in_executor(
+        None, _render_price_chart, prices, hours
+    )
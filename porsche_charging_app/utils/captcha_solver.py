@@ -1,24 +1,159 @@
 import os
-import base64
+import re
+import time
+import orjson
+import pybase64
 import logging
-import requests
+import asyncio
+import hashlib
+import httpx
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from ..core.config import settings
 
+try:
+    from twocaptcha import TwoCaptcha
+    HAS_TWOCAPTCHA = True
+except ImportError:
+    HAS_TWOCAPTCHA = False
+
+try:
+    # Rust-based rasterizer, roughly an order of magnitude faster than
+    # cairosvg on captcha-sized SVGs; optional, cairosvg stays the fallback
+    import resvg_py
+    HAS_RESVG = True
+except ImportError:
+    HAS_RESVG = False
+
+try:
+    # SIMD JPEG encoder via libjpeg-turbo; optional, Pillow's encoder is
+    # the fallback. Constructing TurboJPEG loads the native library, so
+    # any failure (missing wheel or missing .so) disables the path.
+    from turbojpeg import TurboJPEG, TJPF_GRAY
+    _turbo_jpeg = TurboJPEG()
+    HAS_TURBOJPEG = True
+except Exception:
+    HAS_TURBOJPEG = False
+
 logger = logging.getLogger(__name__)
 
+# Data-URL prefix used to detect SVG captchas without lowering/scanning
+# the whole payload.
+_SVG_PREFIX = "data:image/svg"
+
+# Matches the opening <svg ...> tag so the fixups below touch only the tag.
+# Operates on bytes: the decoded payload goes straight to cairosvg without
+# a UTF-8 decode/encode round-trip.
+_SVG_TAG = re.compile(rb"<svg\b[^>]*>")
+
+def _fix_svg(svg_bytes):
+    """Normalize a captcha SVG in one pass: ensure explicit dimensions and
+    a white background rect, both of which cairosvg needs for a clean render."""
+    match = _SVG_TAG.search(svg_bytes)
+    if not match:
+        return svg_bytes
+
+    tag = match.group(0)
+    new_tag = tag
+    if b'width=' not in tag or b'height=' not in tag:
+        # Default width and height (300x100 is common for captchas)
+        new_tag = new_tag.replace(b'<svg', b'<svg width="300" height="100"', 1)
+    if b'<rect' not in svg_bytes:
+        new_tag += b'<rect width="100%" height="100%" fill="white"/>'
+    if new_tag is not tag:
+        svg_bytes = svg_bytes[:match.start()] + new_tag + svg_bytes[match.end():]
+    return svg_bytes
+
 class CaptchaSolver:
     """Class to handle captcha solving via 2captcha API"""
+
+    # Recently solved captchas by payload hash: retries that re-serve the
+    # same image skip a paid 2captcha round trip
+    SOLUTION_CACHE_MAX = 64
+    SOLUTION_CACHE_TTL = 300
+
     def __init__(self):
         self.api_key = settings.CAPTCHA_API_KEY
         if not self.api_key:
             logger.warning("2CAPTCHA_API_KEY not found in .env file. Automatic CAPTCHA solving will not be available.")
-        
+
         self.base_url = "https://2captcha.com/in.php"
         self.result_url = "https://2captcha.com/res.php"
-    
-    def solve_image_captcha(self, image_data):
+
+        # Build the library solver once and reuse one HTTP client so
+        # retries reuse the same TCP/TLS connection.
+        self._solver = TwoCaptcha(self.api_key) if (HAS_TWOCAPTCHA and self.api_key) else None
+        if self._solver is not None and hasattr(self._solver, "pollingInterval"):
+            # Poll at the manual path's cadence instead of the library's
+            # 10s default; hasattr-guarded since the pin on twocaptcha is
+            # loose and older releases lack the attribute
+            self._solver.pollingInterval = 3
+        self._client = None  # shared async HTTP client, created on first use
+        # payload hash -> (solution, monotonic timestamp), LRU-ordered
+        self._solution_cache: OrderedDict = OrderedDict()
+        # The twocaptcha library polls synchronously for 10-30s per solve;
+        # give it its own small pool so those long waits never tie up the
+        # loop's default executor shared by every asyncio.to_thread call
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="captcha")
+
+    def _cached_solution(self, cache_key):
+        """Return a fresh cached solution for the key, or None."""
+        cached = self._solution_cache.get(cache_key)
+        if cached is None:
+            return None
+        solution, ts = cached
+        if time.monotonic() - ts >= self.SOLUTION_CACHE_TTL:
+            del self._solution_cache[cache_key]
+            return None
+        self._solution_cache.move_to_end(cache_key)
+        return solution
+
+    def _cache_solution(self, cache_key, solution):
+        """Remember a successful solve, evicting the oldest entry if full."""
+        if solution is None:
+            return
+        self._solution_cache[cache_key] = (solution, time.monotonic())
+        self._solution_cache.move_to_end(cache_key)
+        while len(self._solution_cache) > self.SOLUTION_CACHE_MAX:
+            self._solution_cache.popitem(last=False)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it lazily.
+
+        Async so a solve in flight never blocks the event loop: the
+        submit/poll cycle spends its time waiting on 2captcha, and
+        cooperative sleeps let the rest of the app keep running.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": "porsche-amber/1.0"},
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+                # Fail fast on a hung 2captcha endpoint: a stalled submit
+                # or poll should surface as an error and retry, not sit on
+                # the login path indefinitely
+                timeout=httpx.Timeout(15.0, connect=3.05),
+            )
+        return self._client
+
+    async def close(self):
+        """Close the shared HTTP client and executor (called on app shutdown)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._executor.shutdown(wait=False)
+
+    async def solve_batch(self, images):
+        """Solve several captchas concurrently.
+
+        2captcha accepts many in-flight jobs per key and the human solve
+        time dominates, so N captchas complete in roughly the slowest
+        solve's time rather than the sum. Returns one solution (or None)
+        per input, in order.
+        """
+        return await asyncio.gather(*(self.solve_image_captcha(img) for img in images))
+
+    async def solve_image_captcha(self, image_data):
         """Solve image captcha using 2captcha API"""
         if not self.api_key:
             logger.error("No 2CAPTCHA_API_KEY available. Cannot solve CAPTCHA automatically.")
@@ -26,74 +161,72 @@ class CaptchaSolver:
             
         logger.info("Processing captcha image...")
         
-        # Determine if it's SVG or another format
-        is_svg = "svg" in image_data.lower()
-        
-        # Extract the base64 image data
-        if "base64" in image_data:
-            img_data_b64 = image_data.split(",")[1]
-        else:
-            img_data_b64 = image_data
-        
-        # Save original image for debugging
-        self._save_captcha_image(img_data_b64, image_data)
+        # Data URLs carry a short "data:image/...;base64" header before the
+        # comma; parse it once instead of scanning the whole payload.
+        header, _, payload = image_data.partition(",")
+        is_svg = header.startswith(_SVG_PREFIX)
+        img_data_b64 = payload if payload else image_data
+
+        # Hash the incoming payload (not the converted JPG) so a duplicate
+        # SVG skips the rasterization as well as the 2captcha round trip.
+        # blake2b is the fastest hash in hashlib and a 16-byte digest is
+        # plenty for a 64-entry dedup cache.
+        cache_key = hashlib.blake2b(img_data_b64.encode(), digest_size=16).digest()
+        cached = self._cached_solution(cache_key)
+        if cached is not None:
+            logger.info("Returning cached solution for previously seen captcha")
+            return cached
+
+        # Save original image only when debugging; the solve path itself
+        # never touches disk
+        if logger.isEnabledFor(logging.DEBUG):
+            self._save_captcha_image(img_data_b64, image_data)
         
-        # For SVG, we need to convert to JPG
-        jpg_file_path = None
+        # For SVG, we need to convert to JPG; otherwise the captcha payload
+        # is already in a format 2captcha accepts, so reuse the base64 as-is.
         if is_svg:
             logger.info("Converting SVG to JPG for 2captcha...")
             jpg_data = self._convert_svg_to_png(img_data_b64)
             if jpg_data:
-                # Save the JPG data to a file
-                jpg_file_path = "captcha_image.jpg"
-                with open(jpg_file_path, "wb") as f:
-                    f.write(jpg_data)
-                logger.info(f"Successfully converted SVG to JPG and saved to {jpg_file_path}")
+                body_b64 = pybase64.b64encode_as_string(jpg_data)
+                logger.info("Successfully converted SVG to JPG")
             else:
                 logger.error("Failed to convert SVG to JPG. Cannot proceed with 2captcha.")
                 return None
         else:
-            # For non-SVG formats, save directly to a file
-            jpg_file_path = "captcha_image.jpg"
-            with open(jpg_file_path, "wb") as f:
-                f.write(base64.b64decode(img_data_b64))
-            logger.info(f"Saved image to {jpg_file_path}")
+            body_b64 = img_data_b64
         
         # Try to use the 2captcha Python library (preferred method)
-        try:
-            from twocaptcha import TwoCaptcha
-            
+        if self._solver is not None:
             logger.info("Using 2captcha Python library for solving...")
-            solver = TwoCaptcha(self.api_key)
-            
-            # Solve using the library with the file path
             try:
-                logger.info(f"Sending {jpg_file_path} to 2captcha for solving...")
-                result = solver.normal(jpg_file_path)
+                logger.info("Sending captcha to 2captcha for solving...")
+                # The library accepts a base64 string, so no file needed.
+                # Its internal submit/poll loop is synchronous, so run it
+                # on the dedicated pool to keep the event loop free.
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._solver.normal, body_b64
+                )
                 if result and 'code' in result:
                     solution = result['code']
                     logger.info(f"Captcha solved successfully using 2captcha library: {solution}")
+                    self._cache_solution(cache_key, solution)
                     return solution
             except Exception as lib_err:
                 logger.error(f"Error with 2captcha library: {lib_err}")
                 logger.info("Falling back to manual API implementation...")
-        except ImportError:
+        else:
             logger.warning("2captcha Python library not found. Using manual API implementation.")
         
         # Fallback to manual API implementation
         logger.info("Using manual 2captcha API implementation...")
         
         try:
-            # Read the JPG file and convert to base64
-            with open(jpg_file_path, "rb") as f:
-                jpg_data = f.read()
-            jpg_data_b64 = base64.b64encode(jpg_data).decode('utf-8')
-            
-            # Prepare the request data
+            # Upload the raw JPG as multipart instead of a base64 body:
+            # skips the encode and the 33% size inflation on the wire
             data = {
                 'key': self.api_key,
-                'method': 'base64',
-                'body': jpg_data_b64,
+                'method': 'post',
                 'json': 1,
                 'phrase': 0,       # Not a phrase
                 'regsense': 1,     # Case sensitive
@@ -107,9 +240,10 @@ class CaptchaSolver:
             
             # Send to 2captcha
             logger.info("Sending captcha to 2captcha for solving...")
-            
-            response = requests.post(self.base_url, data=data)
-            result = response.json()
+
+            files = {'file': ('captcha.jpg', pybase64.b64decode(body_b64), 'image/jpeg')}
+            response = await self._get_client().post(self.base_url, data=data, files=files)
+            result = orjson.loads(response.content)
             
             if result.get('status') != 1:
                 logger.error(f"Failed to submit captcha: {result.get('request')}")
@@ -119,18 +253,30 @@ class CaptchaSolver:
             logger.info(f"Captcha submitted successfully. ID: {captcha_id}")
             
             # Wait for the solution
-            solution = self._get_captcha_solution(captcha_id)
+            solution = await self._get_captcha_solution(captcha_id)
+            self._cache_solution(cache_key, solution)
             return solution
             
         except Exception as e:
             logger.error(f"Error solving captcha: {e}")
             return None
     
-    def _get_captcha_solution(self, captcha_id, max_attempts=30, delay=5):
-        """Poll 2captcha API for the solution"""
-        logger.info(f"Waiting for captcha solution (checking every {delay} seconds)...")
-        
-        for attempt in range(max_attempts):
+    async def _get_captcha_solution(self, captcha_id, initial_delay=15, poll_delay=3,
+                                    max_delay=8, total_timeout=180):
+        """Poll 2captcha API for the solution.
+
+        Human solves take ~20-40s, so wait a realistic minimum up front,
+        then poll quickly while a solve is most likely to land and back off
+        gently (1.3x per miss, capped at max_delay) so slow solves don't
+        hammer res.php. A monotonic deadline bounds the whole wait.
+        """
+        logger.info(f"Waiting {initial_delay}s for captcha solution, then polling every {poll_delay}-{max_delay} seconds...")
+        deadline = time.monotonic() + total_timeout
+        await asyncio.sleep(initial_delay)
+
+        attempt = 0
+        while time.monotonic() < deadline:
+            attempt += 1
             try:
                 params = {
                     'key': self.api_key,
@@ -138,41 +284,47 @@ class CaptchaSolver:
                     'id': captcha_id,
                     'json': 1
                 }
-                
-                response = requests.get(self.result_url, params=params)
-                result = response.json()
+
+                # Polls are tiny responses; time out even sooner than the
+                # client default so a stall just costs one poll cycle
+                response = await self._get_client().get(
+                    self.result_url, params=params,
+                    timeout=httpx.Timeout(10.0, connect=3.05),
+                )
+                result = orjson.loads(response.content)
                 
                 if result.get('status') == 1:
                     logger.info("Captcha solved successfully!")
                     return result.get('request')
-                
-                if "CAPCHA_NOT_READY" not in result.get('request', ''):
+
+                # The server returns the exact token, so compare directly
+                if result.get('request') != 'CAPCHA_NOT_READY':
                     logger.error(f"Error getting captcha solution: {result.get('request')}")
                     return None
                 
-                logger.info(f"Captcha not ready yet. Attempt {attempt+1}/{max_attempts}")
-                import time
-                time.sleep(delay)
-                
+                delay = min(max_delay, poll_delay * 1.3 ** (attempt - 1))
+                logger.info(f"Captcha not ready yet (attempt {attempt}); retrying in {delay:.1f}s")
+                await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+
+            except httpx.TimeoutException:
+                # One stalled poll is not a failed solve; the deadline
+                # above still bounds the total wait
+                logger.warning("2captcha status poll timed out; retrying")
             except Exception as e:
                 logger.error(f"Error checking captcha status: {e}")
                 return None
-        
-        logger.error(f"Timed out waiting for captcha solution after {max_attempts} attempts")
+
+        logger.error(f"Timed out waiting for captcha solution after {total_timeout}s")
         return None
     
     def _save_captcha_image(self, img_data_b64, original_data):
         """Save the captcha image for debugging purposes"""
         try:
-            if "svg" in original_data.lower():
-                file_extension = ".svg"
-                img_data_decoded = base64.b64decode(img_data_b64).decode('utf-8')
-                with open(f"captcha_image{file_extension}", "w") as f:
-                    f.write(img_data_decoded)
-            else:
-                file_extension = ".jpg"
-                with open(f"captcha_image{file_extension}", "wb") as f:
-                    f.write(base64.b64decode(img_data_b64))
+            # The decoded payload is written verbatim either way, so keep it
+            # as bytes and skip the UTF-8 transcode for SVG
+            file_extension = ".svg" if original_data.startswith(_SVG_PREFIX) else ".jpg"
+            with open(f"captcha_image{file_extension}", "wb") as f:
+                f.write(pybase64.b64decode(img_data_b64, validate=True))
             
             logger.info(f"Original captcha image saved to captcha_image{file_extension}")
         except Exception as e:
@@ -181,68 +333,77 @@ class CaptchaSolver:
     def _convert_svg_to_png(self, svg_data_b64):
         """Convert SVG to JPG format that 2captcha can process"""
         try:
-            # Decode the base64 SVG data
-            svg_data = base64.b64decode(svg_data_b64)
-            svg_str = svg_data.decode('utf-8')
-            
-            # Add white background if needed
-            if '<rect' not in svg_str:
-                svg_str = svg_str.replace('<svg ', '<svg><rect width="100%" height="100%" fill="white"/>', 1)
-            
-            # Check if SVG has width and height attributes, add them if not
-            if 'width=' not in svg_str or 'height=' not in svg_str:
-                logger.info("Adding explicit width and height to SVG")
-                # Add default width and height (300x100 is common for captchas)
-                svg_str = svg_str.replace('<svg', '<svg width="300" height="100"', 1)
-            
-            # Save the modified SVG to a temporary file
-            temp_svg_path = "temp_captcha.svg"
-            with open(temp_svg_path, "w") as f:
-                f.write(svg_str)
-            
-            # Try with cairosvg as a fallback
-            try:
-                import cairosvg
-                logger.info("Attempting conversion with cairosvg...")
-                # Try with explicit dimensions
-                png_data = cairosvg.svg2png(
-                    bytestring=svg_str.encode('utf-8'),
-                    parent_width=300,
-                    parent_height=100,
-                    scale=2.0  # Increase resolution
-                )
-                
-                # Save PNG for debugging
-                png_file = "captcha_image.png"
-                with open(png_file, "wb") as f:
+            # Decode the base64 SVG data; keep it as bytes throughout
+            svg_bytes = pybase64.b64decode(svg_data_b64, validate=True)
+
+            # Add white background and explicit dimensions if needed
+            svg_bytes = _fix_svg(svg_bytes)
+
+            # Dump the modified SVG only when debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                with open("temp_captcha.svg", "wb") as f:
+                    f.write(svg_bytes)
+
+            # Rasterize in-process, entirely in memory: resvg when it is
+            # installed, cairosvg otherwise
+            png_data = None
+            if HAS_RESVG:
+                try:
+                    png_data = bytes(resvg_py.svg_to_bytes(svg_string=svg_bytes.decode("utf-8")))
+                except Exception as resvg_err:
+                    logger.warning(f"resvg conversion failed, falling back to cairosvg: {resvg_err}")
+
+            if png_data is None:
+                try:
+                    import cairosvg
+                    logger.info("Attempting conversion with cairosvg...")
+                    # Force the output raster to the upload size: bounds
+                    # Cairo's surface allocation no matter what dimensions
+                    # the (server-supplied) SVG declares, and skips the
+                    # Pillow downscale that a 2x render would need
+                    png_data = cairosvg.svg2png(
+                        bytestring=svg_bytes,
+                        output_width=300,
+                        output_height=100,
+                    )
+                except Exception as cairo_err:
+                    logger.error(f"cairosvg conversion failed: {cairo_err}")
+                    return None
+
+            # Dump the intermediate PNG only when debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                with open("captcha_image.png", "wb") as f:
                     f.write(png_data)
-                logger.info(f"Converted SVG to PNG and saved to {png_file}")
-                
-                # Convert to JPG using Pillow for better compatibility with 2captcha
-                from PIL import Image
-                from io import BytesIO
-                
-                # Open the PNG data
-                img = Image.open(BytesIO(png_data))
-                
-                # Convert to RGB mode (required for JPG)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Save as JPG
-                jpg_path = "captcha_image.jpg"
-                img.save(jpg_path, "JPEG", quality=95)
-                
-                # Read the JPG data
-                with open(jpg_path, "rb") as f:
-                    jpg_data = f.read()
-                
-                logger.info(f"Successfully converted SVG to JPG using cairosvg and saved to {jpg_path}")
-                return jpg_data
-            except Exception as cairo_err:
-                logger.error(f"cairosvg conversion failed: {cairo_err}")
-                return None
-                
+
+            # Convert to JPG using Pillow for better compatibility with 2captcha
+            from PIL import Image
+            from io import BytesIO
+
+            # Open the PNG data
+            img = Image.open(BytesIO(png_data))
+
+            # Grayscale and cap at 300x100: 2captcha's OCR needs neither
+            # colour nor the supersampled resolution, and base64-inflated
+            # uploads shrink several-fold
+            if img.mode != 'L':
+                img = img.convert('L')
+            img.thumbnail((300, 100), Image.BILINEAR)
+
+            # Encode as JPG in memory; quality 85 roughly halves the upload
+            # size versus 95 with no effect on 2captcha's solve accuracy
+            if HAS_TURBOJPEG:
+                import numpy as np
+                jpg_data = _turbo_jpeg.encode(
+                    np.asarray(img)[:, :, None], quality=85, pixel_format=TJPF_GRAY
+                )
+            else:
+                buf = BytesIO()
+                img.save(buf, "JPEG", quality=85)
+                jpg_data = buf.getvalue()
+
+            logger.info("Successfully converted SVG to JPG")
+            return jpg_data
+
         except Exception as e:
             logger.error(f"Error converting SVG to PNG: {e}")
             return None
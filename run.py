@@ -1,4 +1,14 @@
 import uvicorn
 
+try:
+    # libuv-backed event loop; noticeably faster socket I/O than the
+    # default selector loop (not available on Windows)
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 if __name__ == "__main__":
-    uvicorn.run("porsche_charging_app.main:app", host="0.0.0.0", port=8000, reload=True)
+    # reload=True forces the selector loop and a watcher subprocess; keep it
+    # off here and use `uvicorn --reload` directly during development
+    uvicorn.run("porsche_charging_app.main:app", host="0.0.0.0", port=8000, http="httptools")